@@ -0,0 +1,475 @@
+"""
+Asynchronous versions of the Service, Collection
+and Entry classes of atompubbase.model.
+
+They are created from a Context or a URI just like
+their synchronous counterparts, but every method
+that talks to the server returns a Future immediately
+instead of blocking. The requests themselves are
+carried out by a transport, which is any object with a
+request() method that takes the same parameters as
+httplib2.Http.request() and returns a Future of the
+(headers, body) tuple. The default transport,
+ThreadedTransport, runs the requests on a pool of
+threads that each have their own httplib2.Http, so one
+process can have many publish and sync operations
+in flight at the same time:
+
+    transport = ThreadedTransport(max_workers=20)
+    collection = Collection(context, transport)
+    futures = [collection.entry_create(headers, body) for body in bodies]
+    contexts = [f.result() for f in futures]
+
+    for page in Collection(context, transport).pages():
+        for entry in page.result().findall(ATOM_ENTRY):
+            pass
+
+Events are triggered for each request just as they
+are for the wrapped methods of the model classes, the
+POST callbacks running when the response arrives.
+"""
+import events
+import metrics
+import model
+import httplib2
+import sys
+import threading
+import Queue
+
+try:
+    from xml.etree.ElementTree import tostring
+except:
+    from elementtree.ElementTree import tostring
+
+
+class Future(object):
+    """
+    The result of an operation that may not have
+    completed yet.
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._finished = False
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def done(self):
+        return self._finished
+
+    def set_result(self, result):
+        self._finish(result, None)
+
+    def set_exception(self, exc_info):
+        """
+        Complete the Future with the exception
+        described by the 'exc_info' tuple, as returned
+        from sys.exc_info().
+        """
+        self._finish(None, exc_info)
+
+    def _finish(self, result, exc_info):
+        self._condition.acquire()
+        try:
+            self._result = result
+            self._exc_info = exc_info
+            self._finished = True
+            callbacks, self._callbacks = self._callbacks, []
+            self._condition.notifyAll()
+        finally:
+            self._condition.release()
+        for cb in callbacks:
+            cb(self)
+
+    def add_done_callback(self, cb):
+        """
+        Call cb(future) once the Future has completed,
+        immediately if it already has.
+        """
+        self._condition.acquire()
+        try:
+            if not self._finished:
+                self._callbacks.append(cb)
+                return
+        finally:
+            self._condition.release()
+        cb(self)
+
+    def _wait(self, timeout):
+        self._condition.acquire()
+        try:
+            if not self._finished:
+                self._condition.wait(timeout)
+            return self._finished
+        finally:
+            self._condition.release()
+
+    def exception(self, timeout=None):
+        """
+        Wait for the Future to complete and return
+        the exception it failed with, or None.
+        """
+        if not self._wait(timeout):
+            raise RuntimeError("Future did not complete in time")
+        return self._exc_info and self._exc_info[1] or None
+
+    def result(self, timeout=None):
+        """
+        Wait for the Future to complete and return its
+        result, raising the exception if it failed.
+        """
+        if not self._wait(timeout):
+            raise RuntimeError("Future did not complete in time")
+        if self._exc_info:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def then(self, fn):
+        """
+        Returns a new Future for the value of fn(result)
+        once this Future has completed. If fn returns a
+        Future then the new Future completes with it.
+        Failures are passed along without calling fn.
+        """
+        chained = Future()
+        def forward(future):
+            if future._exc_info:
+                chained.set_exception(future._exc_info)
+            else:
+                chained.set_result(future._result)
+        def cb(future):
+            if future._exc_info:
+                chained.set_exception(future._exc_info)
+                return
+            try:
+                value = fn(future._result)
+            except:
+                chained.set_exception(sys.exc_info())
+                return
+            if isinstance(value, Future):
+                value.add_done_callback(forward)
+            else:
+                chained.set_result(value)
+        self.add_done_callback(cb)
+        return chained
+
+
+def completed(result):
+    """
+    Returns a Future that has already completed with 'result'.
+    """
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+class ThreadedTransport(object):
+    """
+    A transport that performs requests on a pool
+    of 'max_workers' threads, each using its own
+    http object created by 'http_factory'.
+    """
+    def __init__(self, http_factory=httplib2.Http, max_workers=10):
+        self._requests = Queue.Queue()
+        self._threads = [threading.Thread(target=self._work, args=(http_factory,)) for i in range(max_workers)]
+        for thread in self._threads:
+            thread.setDaemon(True)
+            thread.start()
+
+    def _work(self, http_factory):
+        http = http_factory()
+        while True:
+            item = self._requests.get()
+            if item is None:
+                break
+            future, args = item
+            try:
+                future.set_result(http.request(*args))
+            except:
+                future.set_exception(sys.exc_info())
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5):
+        future = Future()
+        self._requests.put((future, (uri, method, body, headers, redirections)))
+        return future
+
+    def close(self):
+        """
+        Stop the worker threads once the queued requests are done.
+        """
+        for thread in self._threads:
+            self._requests.put(None)
+
+
+_default_transport = None
+
+def default_transport():
+    """
+    The ThreadedTransport shared by all instances
+    that are not given a transport of their own.
+    """
+    global _default_transport
+    if _default_transport is None:
+        _default_transport = ThreadedTransport()
+    return _default_transport
+
+
+class _Async(object):
+    def __init__(self, model_instance, transport):
+        self._model = model_instance
+        self._context = getattr(model_instance, "_context", None) or model_instance.context
+        self._transport = transport or default_transport()
+
+    def uri(self):
+        return self._model.uri()
+
+    def _request(self, methodname, uri, method="GET", headers=None, body=None):
+        if headers == None:
+            headers = {}
+        headers["-request-uri"] = self.uri()
+        bus = events.bus_for(self)
+        bus.trigger("PRE", methodname, self, headers, body)
+        record = metrics.begin(self, methodname, headers, body, bind=False)
+        future = self._transport.request(uri, method=method, headers=headers, body=body)
+        def post(response):
+            if record is not None:
+                metrics.end(record, response[0], response[1], bind=False)
+            bus.trigger("POST", methodname, self, response[0], response[1])
+            return response
+        return future.then(post)
+
+
+class Service(_Async):
+    """
+    An Atom Publishing Protocol Service Document.
+    """
+    def __init__(self, context_or_uri, transport=None):
+        _Async.__init__(self, model.Service(context_or_uri), transport)
+
+    def context(self):
+        return self._model.context
+
+    def get(self, headers=None, body=None):
+        """
+        Returns a Future of the (headers, body) of the Service Document.
+        """
+        def record(response):
+            self._model._record(*response)
+            return response
+        return self._request("get", self.uri(), headers=headers).then(record)
+
+    def _fetched(self, fn):
+        if self._model.representation:
+            return completed(None).then(fn)
+        return self.get().then(fn)
+
+    def etree(self):
+        return self._fetched(lambda response: self._model._etree)
+
+    def iter_match(self, mimerange):
+        """
+        Returns a Future of the list of collection Contexts
+        that accept the given mimerange.
+        """
+        return self._fetched(lambda response: list(self._model.iter_match(mimerange)))
+
+    def iter(self):
+        return self.iter_match("*/*")
+
+    def iter_info(self):
+        """
+        Returns a Future of the list of (workspace title,
+        collection title, collection URI) tuples.
+        """
+        return self._fetched(lambda response: list(self._model.iter_info()))
+
+
+class Collection(_Async):
+    def __init__(self, context_or_uri, transport=None):
+        _Async.__init__(self, model.Collection(context_or_uri), transport)
+
+    def context(self):
+        return self._model.context()
+
+    def _get_page(self, uri, headers=None, body=None):
+        def record(response):
+            self._model._record_next(uri, *response)
+            return response
+        return self._request("get", uri, headers=headers, body=body).then(record)
+
+    def get(self, headers=None, body=None):
+        """
+        Returns a Future of the (headers, body) of the
+        first feed in the collection.
+        """
+        return self._get_page(self.uri(), headers, body)
+
+    def has_next(self):
+        return self._model.has_next()
+
+    def get_next(self, headers=None, body=None):
+        """
+        Returns a Future of the (headers, body) of
+        the next feed in the collection.
+        """
+        return self._get_page(self._model.next, headers, body)
+
+    def create(self, headers=None, body=None):
+        """
+        Returns a Future of the (headers, body) of
+        the creation of a new member.
+        """
+        return self._request("create", self.uri(), method="POST", headers=headers, body=body)
+
+    def entry_create(self, headers=None, body=None):
+        """
+        Returns a Future of the Context of the newly
+        created entry, or of None if the create failed.
+        """
+        def created(response):
+            headers, body = response
+            if headers.status == 201 and 'location' in headers:
+                return self.context().derive(entry=headers['location'])
+            return None
+        return self._request("create", self.uri(), method="POST", headers=headers, body=body).then(created)
+
+    def pages(self, readahead=2):
+        """
+        Returns a generator of Futures, one for each page
+        of the collection, each of which completes with the
+        ElementTree of that page.
+
+        Up to 'readahead' pages beyond the one last yielded
+        are requested and parsed on the transport while the
+        caller works, so a page is usually ready by the time
+        it is asked for, and no more than that are held.
+        A page that is not retrieved with a 200 ends the
+        iteration, just as it does for model.Collection, and
+        a page that fails is yielded as a failed Future and
+        ends it too. The current page and 'next' of this
+        Collection are only updated on the caller's thread,
+        as each page is yielded.
+        """
+        readahead = max(readahead, 1)
+        ready = Queue.Queue()
+        lock = threading.Lock()
+        # The pages fetched or being fetched but not yet yielded,
+        # and the URI of the next page to fetch once there is room.
+        state = {"ahead": 0, "waiting": None}
+
+        def fetch(uri):
+            # Parse into a Collection of its own, never self._model,
+            # since this runs on the threads of the transport.
+            page = model.Collection(self._context)
+            def parsed(response):
+                page._record_next(uri, *response)
+                return (page.representation, page._etree, page.next)
+            def finished(future):
+                if future._exc_info:
+                    ready.put(("error", future._exc_info))
+                    return
+                representation, etree, next = future._result
+                if etree is None:
+                    ready.put(("done", None))
+                    return
+                ready.put(("page", future._result))
+                if next is None:
+                    ready.put(("done", None))
+                    return
+                lock.acquire()
+                try:
+                    if state["ahead"] >= readahead:
+                        state["waiting"] = next
+                        return
+                    state["ahead"] += 1
+                finally:
+                    lock.release()
+                fetch(next)
+            self._request("get", uri).then(parsed).add_done_callback(finished)
+
+        state["ahead"] = 1
+        fetch(self.uri())
+        while True:
+            kind, value = ready.get()
+            if kind == "done":
+                break
+            if kind == "error":
+                page = Future()
+                page.set_exception(value)
+                yield page
+                break
+            lock.acquire()
+            try:
+                state["ahead"] -= 1
+                waiting, state["waiting"] = state["waiting"], None
+                if waiting is not None:
+                    state["ahead"] += 1
+            finally:
+                lock.release()
+            if waiting is not None:
+                fetch(waiting)
+            self._model.representation, self._model._etree, self._model.next = value
+            yield completed(value[1])
+
+
+class Entry(_Async):
+    def __init__(self, context_or_uri, transport=None):
+        _Async.__init__(self, model.Entry(context_or_uri), transport)
+
+    def context(self):
+        return self._model.context()
+
+    def _fetched(self, fn):
+        if self._model.representation:
+            return completed(None).then(fn)
+        return self.get().then(fn)
+
+    def get(self, headers=None, body=None):
+        """
+        Returns a Future of the (headers, body) of this entry.
+        """
+        def record(response):
+            self._model._record(*response)
+            return response
+        return self._request("get", self.uri(), headers=headers).then(record)
+
+    def etree(self):
+        return self._fetched(lambda response: self._model.etree())
+
+    def has_media(self):
+        """
+        Returns a Future of whether this is a Media Link Entry.
+        """
+        return self._fetched(lambda response: self._model.edit_media != None)
+
+    def get_media(self, headers=None, body=None):
+        return self._fetched(lambda response: self._request("get_media", self._model.edit_media, headers=headers))
+
+    def _clear_on_success(self, response):
+        if response[0].status < 300:
+            self._model._clear()
+        return response
+
+    def put(self, headers=None, body=None):
+        """
+        Returns a Future of the (headers, body) of updating
+        the entry. If no body is given then the current
+        ElementTree of the entry is sent, see model.Entry.put().
+        """
+        if headers == None:
+            headers = {}
+        if 'content-type' not in headers:
+            headers['content-type'] = 'application/atom+xml;type=entry'
+        def send(response):
+            data = body
+            if data == None:
+                data = tostring(self._model._etree)
+            return self._request("put", self.uri(), method="PUT", headers=headers, body=data)
+        return self._fetched(send).then(self._clear_on_success)
+
+    def put_media(self, headers=None, body=None):
+        send = lambda response: self._request("put_media", self._model.edit_media, method="PUT", headers=headers, body=body)
+        return self._fetched(send).then(self._clear_on_success)
+
+    def delete(self, headers=None, body=None):
+        return self._request("delete", self.uri(), method="DELETE", headers=headers).then(self._clear_on_success)
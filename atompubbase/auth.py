@@ -5,7 +5,7 @@ from atompubbase.model import init_event_handlers
 
 init_event_handlers()
 
-def apply_credentials_file(filename, http, error):
+def apply_credentials_file(filename, http, error, bus=None):
     parts = file(filename, "r").read().splitlines()
     if len(parts) == 2:
       name, password = parts
@@ -16,7 +16,7 @@ def apply_credentials_file(filename, http, error):
       if authname != "ClientLogin":
         error(msg.CRED_FILE, "Unknown type of authentication: %s ['ClientLogin' is the only good value at this time.]" % authname)
         return
-      cl = ClientLogin(http, name, password, service)
+      cl = ClientLogin(http, name, password, service, bus)
     else:
       error(msg.CRED_FILE, "Wrong format for credentials file")
 
@@ -26,9 +26,13 @@ class ClientLogin:
   Perform ClientLogin up front, save the auth token, and then
   register for all the PRE events so that we can add the auth token
   to all requests.
+
+  The callback goes on the global event bus, or on 'bus'
+  if given, so that only the requests of the Contexts 
+  using that bus carry the auth token.
   """
 
-  def __init__(self, http, name, password, service):
+  def __init__(self, http, name, password, service, bus=None):
     auth = dict(accountType="HOSTED_OR_GOOGLE", Email=name, Passwd=password, service=service,
                 source='AtomPubBase-1.0')
     resp, content = http.request("https://www.google.com/accounts/ClientLogin", method="POST", body=urlencode(auth), headers={'Content-Type': 'application/x-www-form-urlencoded'})
@@ -38,7 +42,7 @@ class ClientLogin:
         self.Auth = ""
     else:
         self.Auth = d['Auth']
-    atompubbase.events.register_callback("PRE", self.pre_cb)
+    (bus or atompubbase.events.events).register("PRE", self.pre_cb)
 
   def pre_cb(self, headers, body, filters):
     headers['authorization'] = 'GoogleLogin Auth=' + self.Auth 
@@ -0,0 +1,156 @@
+"""
+Stores for the validators (ETag and Last-Modified) of
+resources retrieved through atompubbase.model.
+
+When a Context is given a store the Service, Collection
+and Entry classes send If-None-Match and If-Modified-Since
+with each GET, and on a 304 response they re-use the stored
+body instead of transferring the unchanged document again.
+Just like an httplib2 cache hit the response is then reported
+with a status of 200 and 'fromcache' set to True.
+
+Each store also keeps, in memory, the trees parsed from the
+bodies it holds, in a TreeCache called 'trees', so the
+unchanged document is not parsed again either. Those
+trees are shared and must be treated as read-only.
+
+    c = Context(http, service=uri, validators=SqliteStore("validators.db"))
+
+Each store maps a URI to a tuple of (etag, last_modified, body).
+"""
+import anydbm
+import marshal
+import sqlite3
+import threading
+from treecache import TreeCache
+
+
+class MemoryStore(object):
+    """
+    Keeps validators in memory for the life of the process.
+    """
+    def __init__(self):
+        self._validators = {}
+        self.trees = TreeCache()
+
+    def __getstate__(self):
+        return self._validators
+
+    def __setstate__(self, validators):
+        self.__init__()
+        self._validators = validators
+
+    def get(self, uri):
+        """
+        Returns the (etag, last_modified, body) tuple
+        stored for 'uri', or None.
+        """
+        return self._validators.get(uri)
+
+    def set(self, uri, etag, last_modified, body):
+        self._validators[uri] = (etag, last_modified, body)
+
+    def delete(self, uri):
+        self._validators.pop(uri, None)
+
+
+class DbmStore(object):
+    """
+    Keeps validators in a dbm file. When pickled, along
+    with a Context, only the name of the file is kept.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._db = anydbm.open(filename, "c")
+        self.trees = TreeCache()
+
+    def __getstate__(self):
+        return self.filename
+
+    def __setstate__(self, filename):
+        self.__init__(filename)
+
+    def _key(self, uri):
+        if isinstance(uri, unicode):
+            return uri.encode('utf-8')
+        return uri
+
+    def get(self, uri):
+        key = self._key(uri)
+        self._lock.acquire()
+        try:
+            if self._db.has_key(key):
+                return marshal.loads(self._db[key])
+            return None
+        finally:
+            self._lock.release()
+
+    def set(self, uri, etag, last_modified, body):
+        value = marshal.dumps((etag, last_modified, body))
+        self._lock.acquire()
+        try:
+            self._db[self._key(uri)] = value
+        finally:
+            self._lock.release()
+
+    def delete(self, uri):
+        key = self._key(uri)
+        self._lock.acquire()
+        try:
+            if self._db.has_key(key):
+                del self._db[key]
+        finally:
+            self._lock.release()
+
+    def close(self):
+        self._lock.acquire()
+        try:
+            self._db.close()
+        finally:
+            self._lock.release()
+
+
+class SqliteStore(object):
+    """
+    Keeps validators in an sqlite database. When pickled,
+    along with a Context, only the name of the file is kept.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.trees = TreeCache()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.text_factory = str
+        self._db.execute("CREATE TABLE IF NOT EXISTS validators (uri TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body BLOB)")
+        self._db.commit()
+
+    def __getstate__(self):
+        return self.filename
+
+    def __setstate__(self, filename):
+        self.__init__(filename)
+
+    def _execute(self, sql, args):
+        self._lock.acquire()
+        try:
+            row = self._db.execute(sql, args).fetchone()
+            self._db.commit()
+            return row
+        finally:
+            self._lock.release()
+
+    def get(self, uri):
+        row = self._execute("SELECT etag, last_modified, body FROM validators WHERE uri = ?", (uri,))
+        if row:
+            return (row[0], row[1], str(row[2]))
+        return None
+
+    def set(self, uri, etag, last_modified, body):
+        self._execute("INSERT OR REPLACE INTO validators VALUES (?, ?, ?, ?)", (uri, etag, last_modified, buffer(body)))
+
+    def delete(self, uri):
+        self._execute("DELETE FROM validators WHERE uri = ?", (uri,))
+
+    def close(self):
+        self._db.close()
@@ -7,7 +7,7 @@ register for callbacks when a member function is called,
 filtering on when to trigger the callback. There
 are several axes that can be used to filter on:
 
-Time          PRE|POST
+Time          PRE|POST|PROGRESS
 Method Name   GET|PUT|DELETE|CREATE
 Media         MEDIA|NEXT
 Class         SERVICE|COLLECTION|ENTRY
@@ -69,24 +69,76 @@ These are all valid filters:
     POST_COLLECTION - Called after any Collection classes member function is called.
     POST_COLLECTION_CREATE - Called after Collection.create() is called.
     ANY             - Called before and after every classes member function is called.
+
+Callbacks registered with register_callback() go on the
+global bus and apply to every instance. A Context can
+instead carry its own bus, an Events instance, and the 
+instances created from it then only trigger the callbacks
+on that bus. Give the bus the global one as its parent
+if the global callbacks should still be called:
+
+    bus = Events(parent=events)
+    bus.register("PRE", add_auth_header)
+    context = Context(http, service=uri, bus=bus)
+
+Callbacks are called inline, so a slow callback delays
+the request that triggered it. Callbacks that only observe,
+like loggers and validators, can be handed to a Dispatcher
+instead, which queues them to its own worker threads:
+
+    dispatcher = Dispatcher(workers=2, max_queue=1000, overflow="drop")
+    register_callback("POST", audit_log, dispatcher)
+
+Such callbacks get a copy of the headers, so a PRE callback
+that changes the request headers must not use a Dispatcher.
+
+Entry.put_media(), Collection.create() and
+Collection.entry_create() trigger PROGRESS events as a
+file body is uploaded. The body passed to the callback
+is a tuple of (bytes sent, total bytes), where the total
+is None if it is not known. PROGRESS events must be asked
+for explicitly, they are not matched by ANY:
+
+    register_callback("PROGRESS_PUT_MEDIA", show_progress)
 """
 import sys
+import copy
+import threading
+import traceback
+import Queue
+import metrics
 
 PREPOST = set(["PRE", "POST"])
+WHEN = PREPOST | set(["PROGRESS"])
 WRAPPABLE = set(["get", "put", "delete", "create"])
 
 class Events(object):
-    def __init__(self):
+    def __init__(self, parent=None):
+        """
+        Callbacks on the 'parent' Events, if given, are
+        called after the callbacks on this one.
+        """
+        self.parent = parent
         # Callbacks are a list of tuples (filter, cb)
         # where filter the set is the set of method attributes 
         # used to select that callback.
         self.callbacks = []
-        
-    def register(self, filter, cb):
+        # The dispatch table maps (PRE/POST, class, method name)
+        # to the attributes passed to the callbacks and the list of 
+        # callbacks that match them. It is filled in as methods
+        # are called and thrown away whenever the callbacks change.
+        # Changes to either, and filling in the table, are made
+        # under the lock, reads of the table are not.
+        self._dispatch = {}
+        self._lock = threading.Lock()
+
+    def register(self, filter, cb, dispatcher=None):
         """
         Add a callback (cb) to be called when it matches
         the filter. The filter is a string of attibute 
-        names separated by underscores.
+        names separated by underscores. If a Dispatcher
+        is given the callback is queued to it instead of
+        being called inline.
 
         Example:
           events.register("PRE_ENTRY", mycb)
@@ -95,42 +147,220 @@ class Events(object):
         method is called in the Entry class.
         """
         filter = set([coord for coord in filter.upper().split("_")])
-        if not PREPOST.intersection(filter) and "ANY" not in filter:
+        if not WHEN.intersection(filter) and "ANY" not in filter:
             filter.add("PRE")
-        self.callbacks.append((filter, cb))
+        if dispatcher is not None:
+            cb = _Deferred(dispatcher, cb)
+        self._lock.acquire()
+        try:
+            self.callbacks.append((filter, cb))
+            self._dispatch = {}
+        finally:
+            self._lock.release()
 
     def clear(self):
-        self.callbacks = []
-        
-    def trigger(self, when, methodname, instance, headers, body):
+        self._lock.acquire()
+        try:
+            self.callbacks = []
+            self._dispatch = {}
+        finally:
+            self._lock.release()
+
+    def _compile(self, when, classname, methodname):
         method_filter = set(methodname.upper().split("_"))        
-        method_filter.add(instance.__class__.__name__.upper())
+        method_filter.add(classname.upper())
         method_filter.add(when)
         matches = method_filter.copy()
-        matches.add("ANY")
-        for filter, cb in self.callbacks:
-            if filter.issubset(matches):
-                cb(headers, body, method_filter)
+        if when in PREPOST:
+            matches.add("ANY")
+        return (frozenset(method_filter), [cb for filter, cb in self.callbacks if filter.issubset(matches)])
+        
+    def _lookup(self, when, methodname, instance):
+        key = (when, instance.__class__, methodname)
+        try:
+            return self._dispatch[key]
+        except KeyError:
+            pass
+        # Compiled under the lock so that a table compiled from
+        # the callbacks before a register() or clear() is never
+        # stored in the table that replaced it.
+        self._lock.acquire()
+        try:
+            compiled = self._dispatch.get(key)
+            if compiled is None:
+                compiled = self._dispatch[key] = self._compile(when, instance.__class__.__name__, methodname)
+            return compiled
+        finally:
+            self._lock.release()
+
+    def listening(self, when, methodname, instance):
+        """
+        Returns True if trigger() would call any callbacks,
+        so that work done only to report an event can be
+        skipped.
+        """
+        if self._lookup(when, methodname, instance)[1]:
+            return True
+        return self.parent is not None and self.parent.listening(when, methodname, instance)
+
+    def trigger(self, when, methodname, instance, headers, body):
+        method_filter, callbacks = self._lookup(when, methodname, instance)
+        for cb in callbacks:
+            cb(headers, body, method_filter)
+        if self.parent is not None:
+            self.parent.trigger(when, methodname, instance, headers, body)
         
 
 events = Events()
 
 
+OVERFLOW = set(["block", "drop", "sample"])
+
+class Dispatcher(object):
+    """
+    Calls event callbacks on a pool of worker threads.
+
+    Calls wait in a queue of at most 'max_queue' entries.
+    When the queue is full the 'overflow' policy decides
+    what happens to a new call:
+
+      block  - the triggering thread waits for room.
+      drop   - the call is thrown away.
+      sample - one call in every 'sample' waits for room,
+               the rest are thrown away.
+
+    The number of calls dropped is kept in 'dropped', and 
+    the number of callbacks that raised an exception in 
+    'errors'. The tracebacks are written to stderr.
+    """
+    def __init__(self, workers=1, max_queue=1000, overflow="block", sample=10):
+        if overflow not in OVERFLOW:
+            raise ValueError("Unknown overflow policy '%s'" % overflow)
+        self.overflow = overflow
+        self.sample = sample
+        self.dropped = 0
+        self.errors = 0
+        self._overflowed = 0
+        self._lock = threading.Lock()
+        self._queue = Queue.Queue(max_queue)
+        self._workers = []
+        for i in range(workers):
+            worker = threading.Thread(target=self._work)
+            worker.setDaemon(True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                cb, headers, body, method_filter = item
+                try:
+                    cb(headers, body, method_filter)
+                except:
+                    self._lock.acquire()
+                    self.errors += 1
+                    self._lock.release()
+                    traceback.print_exc()
+            finally:
+                self._queue.task_done()
+
+    def submit(self, cb, headers, body, method_filter):
+        """
+        Queue a call of cb(headers, body, method_filter).
+        Returns False if the call was dropped.
+        """
+        item = (cb, headers, body, method_filter)
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except Queue.Full:
+            pass
+        if self.overflow != "block":
+            self._lock.acquire()
+            try:
+                self._overflowed += 1
+                keep = self.overflow == "sample" and self._overflowed % self.sample == 0
+                if not keep:
+                    self.dropped += 1
+            finally:
+                self._lock.release()
+            if not keep:
+                return False
+        self._queue.put(item)
+        return True
+
+    def join(self):
+        """
+        Wait until every queued call has been made.
+        """
+        self._queue.join()
+
+    def close(self):
+        """
+        Make the queued calls and stop the workers.
+        """
+        for worker in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+
+class _Deferred(object):
+    """
+    A callback that is queued to a Dispatcher when called.
+    """
+    def __init__(self, dispatcher, cb):
+        self.dispatcher = dispatcher
+        self.cb = cb
+
+    def __call__(self, headers, body, method_filter):
+        # A shallow copy keeps the type of the headers, and so the
+        # status and other attributes of an httplib2.Response.
+        self.dispatcher.submit(self.cb, copy.copy(headers), body, method_filter)
+
+
+def bus_for(instance):
+    """
+    Returns the bus that events for the given instance
+    are sent to: the bus of its Context, if it has one,
+    or else the global bus.
+    """
+    context = getattr(instance, "_context", None) or getattr(instance, "context", None)
+    bus = getattr(context, "bus", None)
+    if bus is None:
+        return events
+    return bus
+
+
 def _wrap(method, methodname):
     """
     Create a closure around the given method that calls into
     the eventing system.
     """
-    def wrapped(self, headers=None, body=None):
+    def wrapped(self, headers=None, body=None, **kwargs):
         if headers == None:
           headers = {}
         try:
           headers["-request-uri"] = self.uri()
         except AttributeError:
           pass
-        events.trigger("PRE", methodname, self, headers, body)
-        (headers, body) = method(self, headers, body)
-        events.trigger("POST", methodname, self, headers, body)
+        bus = bus_for(self)
+        bus.trigger("PRE", methodname, self, headers, body)
+        record = metrics.begin(self, methodname, headers, body)
+        if record is None:
+            (headers, body) = method(self, headers, body, **kwargs)
+        else:
+            try:
+                (headers, body) = method(self, headers, body, **kwargs)
+            except:
+                metrics.end(record, None, None)
+                raise
+            metrics.end(record, headers, body)
+        bus.trigger("POST", methodname, self, headers, body)
         return (headers, body)
     return wrapped
 
@@ -149,11 +379,13 @@ def add_event_handlers(theclass):
                 setattr(theclass, methodname, _wrap(method, methodname))
         _wrapped.add(theclass)
 
-def register_callback(filter, cb):
+def register_callback(filter, cb, dispatcher=None):
     """
     Add a callback (cb) to be called when it matches
     the filter. The filter is a string of attibute 
-    names separated by underscores.
+    names separated by underscores. If a Dispatcher
+    is given the callback is queued to it instead of
+    being called inline.
 
     Example:
       register_callback("PRE_ENTRY", mycb)
@@ -162,7 +394,7 @@ def register_callback(filter, cb):
     method is called in the Entry class.
     """
  
-    events.register(filter, cb)
+    events.register(filter, cb, dispatcher)
 
 def clear():
     """
@@ -171,4 +403,4 @@ def clear():
     events.clear()
 
 
-__all__ = ["add_event_handlers", "register_callback", "clear"]
+__all__ = ["Events", "Dispatcher", "add_event_handlers", "register_callback", "clear"]
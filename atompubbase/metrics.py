@@ -0,0 +1,212 @@
+"""
+Timing records for the requests made through atompubbase.model.
+
+When a sink is installed every call of a method wrapped
+by the event system, see model.init_event_handlers(),
+produces a Record with the start and end time of the call,
+the bytes sent and received, the time spent parsing the
+response, the number of entries on a collection page and
+whether the response came from a cache. The record is
+handed to the sink's emit() method:
+
+    metrics.sink = MemorySink()
+    ...
+    print metrics.sink.prometheus()
+
+A sink is any object with an emit(record) method. Records
+are only made while a sink is installed, so there is no
+cost otherwise.
+
+Pages parsed with Collection.iter_entry(streaming=True) are
+parsed after the request has completed, and their records
+have no parse time or entry count.
+"""
+import time
+import bisect
+import threading
+
+# The installed sink, or None.
+sink = None
+
+_local = threading.local()
+
+
+class Record(object):
+    """
+    The timing of one call of a wrapped method.
+
+    cache is "hit" if the response was served or revalidated
+    from a cache, and "miss" otherwise. tree_cache is "hit"
+    if the parsed tree came from model.tree_cache, "miss" if
+    the body was parsed, and None if nothing was parsed.
+    """
+    __slots__ = ["classname", "method", "uri", "status", "start", "end",
+                 "bytes_sent", "bytes_received", "parse_seconds", "entries",
+                 "cache", "tree_cache", "_sink", "_outer"]
+
+    def __init__(self, classname, method, uri):
+        self.classname = classname
+        self.method = method
+        self.uri = uri
+        self.status = None
+        self.start = self.end = None
+        self.bytes_sent = self.bytes_received = 0
+        self.parse_seconds = 0.0
+        self.entries = None
+        self.cache = self.tree_cache = None
+
+    def seconds(self):
+        return self.end - self.start
+
+
+def _length(body):
+    if isinstance(body, basestring):
+        return len(body)
+    return 0
+
+
+def begin(instance, methodname, headers, body, bind=True):
+    """
+    Start a Record for a call of 'methodname' on 'instance',
+    or return None if no sink is installed. If 'bind' is
+    True the record is the current one for this thread
+    until end() is called.
+    """
+    if sink is None:
+        return None
+    record = Record(instance.__class__.__name__, methodname, headers.get("-request-uri"))
+    record._sink = sink
+    record._outer = None
+    if bind:
+        record._outer = getattr(_local, "record", None)
+        _local.record = record
+    record.bytes_sent = _length(body)
+    record.start = time.time()
+    return record
+
+
+def end(record, headers, body, bind=True):
+    """
+    Complete the record with the response and emit it.
+    """
+    record.end = time.time()
+    if bind:
+        _local.record = record._outer
+    record.status = getattr(headers, "status", None)
+    record.bytes_received = _length(body)
+    if getattr(headers, "fromcache", False):
+        record.cache = "hit"
+    else:
+        record.cache = "miss"
+    record._sink.emit(record)
+
+
+def current():
+    """
+    Returns the Record of the call in progress on
+    this thread, or None.
+    """
+    return getattr(_local, "record", None)
+
+
+DEFAULT_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+ENTRY_BUCKETS = [0, 1, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+
+class Histogram(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels):
+    return ",".join(['%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                     for name, value in labels])
+
+
+class MemorySink(object):
+    """
+    Aggregates records into histograms and counters
+    labelled by class and method name:
+
+      atompub_request_seconds     histogram of the time of each call
+      atompub_parse_seconds       histogram of the time spent parsing
+      atompub_entries_per_page    histogram of entries on each collection page
+      atompub_bytes_sent_total    counter
+      atompub_bytes_received_total counter
+      atompub_requests_total      counter, also labelled by cache hit or miss
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        # Map (name, labels) to a Histogram or a number.
+        self.histograms = {}
+        self.counters = {}
+
+    def _observe(self, name, labels, value, buckets=None):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets or self._buckets)
+        histogram.observe(value)
+
+    def _add(self, name, labels, value):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def emit(self, record):
+        labels = (("class", record.classname), ("method", record.method))
+        self._lock.acquire()
+        try:
+            self._observe("atompub_request_seconds", labels, record.seconds())
+            if record.tree_cache is not None:
+                self._observe("atompub_parse_seconds", labels, record.parse_seconds)
+            if record.entries is not None:
+                self._observe("atompub_entries_per_page", labels, record.entries, ENTRY_BUCKETS)
+            self._add("atompub_bytes_sent_total", labels, record.bytes_sent)
+            self._add("atompub_bytes_received_total", labels, record.bytes_received)
+            self._add("atompub_requests_total", labels + (("cache", record.cache),), 1)
+        finally:
+            self._lock.release()
+
+    def histogram(self, name, classname, method):
+        """
+        Returns the named Histogram for a class and method, or None.
+        """
+        return self.histograms.get((name, (("class", classname), ("method", method))))
+
+    def prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        self._lock.acquire()
+        try:
+            names = sorted(set([name for name, labels in self.histograms]))
+            for name in names:
+                lines.append("# TYPE %s histogram" % name)
+                for (hname, labels), histogram in sorted(self.histograms.items()):
+                    if hname != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ["+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append("%s_bucket{%s} %d" % (name, _labels(labels + (("le", bound),)), cumulative))
+                    lines.append("%s_sum{%s} %r" % (name, _labels(labels), float(histogram.sum)))
+                    lines.append("%s_count{%s} %d" % (name, _labels(labels), histogram.count))
+            names = sorted(set([name for name, labels in self.counters]))
+            for name in names:
+                lines.append("# TYPE %s counter" % name)
+                for (cname, labels), value in sorted(self.counters.items()):
+                    if cname == name:
+                        lines.append("%s{%s} %d" % (name, _labels(labels), value))
+        finally:
+            self._lock.release()
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,169 @@
+"""
+A local copy of a collection kept in an sqlite database.
+
+For every member the mirror holds the raw entry XML,
+the edit and edit-media links, the app:edited time and,
+if the member itself has been retrieved, its ETag.
+Members can then be looked up by atom:id or by edit URI
+without walking the collection:
+
+    mirror = CollectionMirror(Collection(context), "mirror.db")
+    mirror.refresh()
+    member = mirror.by_id("tag:example.org,2008:1")
+    member = mirror.by_edit("http://example.org/entry/1")
+    entry = fromstring(member.xml)
+
+refresh() is built on sync.CollectionSync, so only the
+pages that hold members edited since the last refresh
+are retrieved. Pass full=True to also drop deleted members.
+"""
+import sqlite3
+import threading
+from collections import namedtuple
+from model import Collection, absolutize, link_value, get_many, copy_http
+from sync import CollectionSync
+from util import ATOM
+
+try:
+    from xml.etree.ElementTree import tostring
+except:
+    from elementtree.ElementTree import tostring
+
+
+Member = namedtuple("Member", "id edit edit_media edited etag xml")
+
+
+class _Known(object):
+    """
+    The mapping of atom:id to edited time that CollectionSync
+    keeps, read from and written to the members table.
+    """
+    def __init__(self, mirror):
+        self._mirror = mirror
+
+    def get(self, id, default=None):
+        row = self._mirror._execute("SELECT edited FROM members WHERE id = ?", (id,))
+        if not row:
+            return default
+        return row[0][0]
+
+    def __getitem__(self, id):
+        row = self._mirror._execute("SELECT edited FROM members WHERE id = ?", (id,))
+        if not row:
+            raise KeyError(id)
+        return row[0][0]
+
+    def __contains__(self, id):
+        return self._mirror._execute("SELECT 1 FROM members WHERE id = ?", (id,)) != []
+
+    def __setitem__(self, id, edited):
+        self._mirror._execute("INSERT OR IGNORE INTO members (id) VALUES (?)", (id,))
+        self._mirror._execute("UPDATE members SET edited = ? WHERE id = ?", (edited, id))
+
+    def __delitem__(self, id):
+        self._mirror._execute("DELETE FROM members WHERE id = ?", (id,))
+
+    def __iter__(self):
+        return iter([row[0] for row in self._mirror._execute("SELECT id FROM members", ())])
+
+
+class CollectionMirror(object):
+    def __init__(self, collection_or_context, filename):
+        """
+        Mirror a Collection, or the collection of a Context,
+        into the sqlite database 'filename'.
+        """
+        if isinstance(collection_or_context, Collection):
+            self.collection = collection_or_context
+        else:
+            self.collection = Collection(collection_or_context)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.text_factory = str
+        self._db.execute("CREATE TABLE IF NOT EXISTS members (id TEXT PRIMARY KEY, edit TEXT, edit_media TEXT, edited REAL, etag TEXT, xml BLOB)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS members_edit ON members (edit)")
+        self._db.commit()
+        self._sync = CollectionSync(self.collection, known=_Known(self))
+        row = self._execute("SELECT edited, id FROM members WHERE edited IS NOT NULL ORDER BY edited DESC, id DESC LIMIT 1", ())
+        if row:
+            self._sync.high_water = tuple(row[0])
+
+    def _execute(self, sql, args):
+        self._lock.acquire()
+        try:
+            return self._db.execute(sql, args).fetchall()
+        finally:
+            self._lock.release()
+
+    def _store(self, entry, xml, etag=None):
+        base = self.collection.uri()
+        edit = absolutize(base, link_value(entry, ".", "edit"))
+        edit_media = absolutize(base, link_value(entry, ".", "edit-media"))
+        self._execute("UPDATE members SET edit = ?, edit_media = ?, etag = ?, xml = ? WHERE id = ?",
+            (edit, edit_media, etag, buffer(xml), entry.findtext(ATOM("id"))))
+
+    def refresh(self, full=False, fetch=False, max_workers=4, http_factory=copy_http):
+        """
+        Bring the mirror up to date with the collection.
+
+        Members are stored as they appear in the collection
+        feed. If 'fetch' is True then every created or updated
+        member is also retrieved, see model.get_many(), and its
+        full representation and ETag are stored instead. The
+        workers use copies of the collection's http object
+        unless a custom 'http_factory' replaces it.
+
+        Returns the (created, updated, deleted) tuple
+        from CollectionSync.sync(). If an exception is raised
+        nothing is changed and the next refresh starts over.
+        """
+        self._lock.acquire()
+        high_water = self._sync.high_water
+        try:
+            created, updated, deleted = self._sync.sync(full)
+            changed = created + updated
+            for entry in changed:
+                self._store(entry, tostring(entry))
+            if fetch:
+                contexts = []
+                for entry in changed:
+                    edit = absolutize(self.collection.uri(), link_value(entry, ".", "edit"))
+                    contexts.append(self.collection.context().derive(entry=edit))
+                for entry, error in get_many(contexts, max_workers, True, http_factory):
+                    if error is None and entry._etree.findtext(ATOM("id")) in self._sync.known:
+                        self._store(entry._etree, entry.representation, entry.etag)
+            self._db.commit()
+        except:
+            # The edited times are written as the feed is read,
+            # they must not be kept without the entries.
+            self._db.rollback()
+            self._sync.high_water = high_water
+            raise
+        finally:
+            self._lock.release()
+        return (created, updated, deleted)
+
+    def _member(self, column, value):
+        rows = self._execute("SELECT id, edit, edit_media, edited, etag, xml FROM members WHERE %s = ?" % column, (value,))
+        if not rows:
+            return None
+        id, edit, edit_media, edited, etag, xml = rows[0]
+        return Member(id, edit, edit_media, edited, etag, xml is not None and str(xml) or None)
+
+    def by_id(self, id):
+        """
+        Returns the Member with the given atom:id, or None.
+        """
+        return self._member("id", id)
+
+    def by_edit(self, uri):
+        """
+        Returns the Member with the given edit URI, or None.
+        """
+        return self._member("edit", uri)
+
+    def __len__(self):
+        return self._execute("SELECT COUNT(*) FROM members", ())[0][0]
+
+    def close(self):
+        self._db.close()
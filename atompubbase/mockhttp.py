@@ -3,6 +3,7 @@ import urllib
 import httplib2
 from email import message_from_string, message_from_file
 import os
+from StringIO import StringIO
 
 
 
@@ -15,7 +16,11 @@ class MockHttp:
         self.directory = directory
         self.hit_counter = {}
 
-    def request(self, uri, method="GET", body=None, headers=None, redirections=5):
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, stream=False, progress=None):
+        if hasattr(body, "read"):
+            sent = len(body.read())
+            if progress is not None:
+                progress(sent, sent)
         counter = self.hit_counter.get(method+uri, 0)
         counter += 1
         self.hit_counter[method+uri] = counter
@@ -30,9 +35,11 @@ class MockHttp:
             f.close()
             body = response.get_payload()
             headers = httplib2.Response(response)
-            return (headers, body)
         else:
-            return (httplib2.Response({"status": "404"}), "")
+            headers, body = (httplib2.Response({"status": "404"}), "")
+        if stream:
+            body = StringIO(body)
+        return (headers, body)
 
     def add_credentials(self, name, password):
         pass
@@ -44,11 +51,14 @@ class MockRecorder(httplib2.Http):
         self.directory = directory
         self.hit_counter = {}
         
-    def request(self, uri, method="GET", body=None, headers=None, redirections=5):
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, progress=None):
         counter = self.hit_counter.get(method+uri, 0)
         counter += 1
         self.hit_counter[method+uri] = counter
-        headers, body = self.h.request(uri, method, body, headers, redirections)
+        if progress is None:
+            headers, body = self.h.request(uri, method, body, headers, redirections)
+        else:
+            headers, body = self.h.request(uri, method, body, headers, redirections, progress=progress)
         path = urlparse.urlparse(uri)[2]
         fname = os.path.join(self.directory, method, urllib.quote(path.strip("/")) + ".file")
         if counter >= 2:
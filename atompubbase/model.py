@@ -49,15 +49,22 @@ Here is an example of how the classes are used together:
 
 """
 import events
+import metrics
+import resumable
 from mimeparse import mimeparse
 import urlparse
 import httplib2
 import copy
+import sys
+import time
+import threading
+import Queue
+from collections import namedtuple
 
 try:
-    from xml.etree.ElementTree import fromstring, tostring
+    from xml.etree.ElementTree import fromstring, tostring, iterparse
 except:
-    from elementtree.ElementTree import fromstring, tostring
+    from elementtree.ElementTree import fromstring, tostring, iterparse
 
 from xml.parsers.expat import ExpatError
 
@@ -72,6 +79,12 @@ APP_COLL = "{%s}collection" % APP
 APP_MEMBER_TYPE = "{%s}accept" % APP
 XHTML_DIV = "{%s}div" % XHTML
 
+# Set to a TreeCache() to share the trees parsed from documents
+# that carry an ETag across all instances. The trees returned
+# by Service.etree(), Collection.etree() and iter_entry() are
+# then shared and must not be modified.
+tree_cache = None
+
 class ParseException(Exception):
     def __init__(self, headers, body):
         self.headers = headers
@@ -105,6 +118,129 @@ def absolutize(baseuri, uri):
         uri = urlparse.urljoin(baseuri, uri)
     return uri
 
+def conditional_request(context, uri, headers=None, body=None):
+    """
+    GET the given uri through context.http. If the context
+    has a validator store then the stored ETag and Last-Modified
+    are sent along, and a 304 response is turned into a 200 
+    carrying the stored body, with 'fromcache' and
+    'revalidated' set to True.
+    The stored validators are only dropped when the resource
+    is gone or comes back without them, not on an error that
+    may be temporary.
+
+    Returns a tuple of the HTTP response headers and the body.
+    """
+    store = context.validators
+    if store is None:
+        return context.http.request(uri, headers=headers, body=body)
+    cached = store.get(uri)
+    if cached:
+        headers = dict(headers or {})
+        etag, last_modified, cached_body = cached
+        if etag and 'if-none-match' not in headers:
+            headers['if-none-match'] = etag
+        if last_modified and 'if-modified-since' not in headers:
+            headers['if-modified-since'] = last_modified
+    response, content = context.http.request(uri, headers=headers, body=body)
+    if response.status == 304 and cached:
+        response = httplib2.Response(response)
+        response.status = 200
+        response['status'] = "200"
+        response.fromcache = True
+        response.revalidated = True
+        if etag and 'etag' not in response:
+            response['etag'] = etag
+        if last_modified and 'last-modified' not in response:
+            response['last-modified'] = last_modified
+        return (response, cached_body)
+    if response.status == 200:
+        if 'etag' in response or 'last-modified' in response:
+            store.set(uri, response.get('etag'), response.get('last-modified'), content)
+        else:
+            store.delete(uri)
+    elif response.status in (404, 410):
+        store.delete(uri)
+    return (response, content)
+
+def upload_request(instance, methodname, uri, method, headers=None, body=None, path=None):
+    """
+    Send 'body' to the given uri through the http object of
+    the instance's context. The body may be a string, an
+    open file or an mmap, or the file named by 'path' is
+    sent. Files and mmaps are sent a block at a time and
+    never read into memory as a whole, and as they are sent
+    PROGRESS events are triggered for 'methodname' on the
+    instance, see atompubbase.events. The http object only
+    needs to support httplib2.Http's 'progress' argument
+    if there are PROGRESS callbacks.
+
+    Returns a tuple of the HTTP response headers and the body.
+    """
+    f = None
+    if path is not None:
+        f = body = open(path, "rb")
+    try:
+        bus = events.bus_for(instance)
+        if not hasattr(body, "read") or not bus.listening("PROGRESS", methodname, instance):
+            return instance._context.http.request(uri, method=method, headers=headers, body=body)
+        def progress(sent, total):
+            bus.trigger("PROGRESS", methodname, instance, headers or {}, (sent, total))
+        return instance._context.http.request(uri, method=method, headers=headers, body=body, progress=progress)
+    finally:
+        if f is not None:
+            f.close()
+
+def _trees(validators):
+    return getattr(validators, "trees", None)
+
+def parse(uri, headers, body, validators=None):
+    """
+    Parse the body retrieved from uri. The tree is re-used,
+    instead of parsing the body again, if the response was
+    revalidated through the validator store 'validators',
+    which keeps the trees parsed from the bodies it holds,
+    or if tree_cache is set and has a tree parsed from
+    the representation with the same ETag. A re-used
+    tree is shared and must not be modified.
+    """
+    record = metrics.current()
+    etag = headers.get('etag')
+    trees = _trees(validators)
+    version = etag or headers.get('last-modified')
+    etree = None
+    if trees is not None and version and getattr(headers, 'revalidated', False):
+        etree = trees.get(uri, version)
+    if etree is None and etag and tree_cache is not None:
+        etree = tree_cache.get(uri, etag)
+    if etree is not None:
+        if record is not None:
+            record.tree_cache = "hit"
+        return etree
+    started = time.time()
+    try:
+        etree = fromstring(body)
+    except (ExpatError, SyntaxError):
+        raise ParseException(headers, body)
+    if record is not None:
+        record.tree_cache = "miss"
+        record.parse_seconds += time.time() - started
+    if etag and tree_cache is not None:
+        tree_cache.set(uri, etag, len(body), etree)
+    if trees is not None and version:
+        # The body is the one now held by the store.
+        trees.set(uri, version, len(body), etree)
+    return etree
+
+def _shared(validators, headers):
+    """
+    True if parse() may have shared the tree it
+    returned for a response with these headers.
+    """
+    if tree_cache is not None and 'etag' in headers:
+        return True
+    return _trees(validators) is not None and ('etag' in headers or 'last-modified' in headers)
+
 def link_value(etree, xpath, relation):
     """
     Given and elementtree element 'etree', find all link
@@ -118,25 +254,58 @@ def link_value(etree, xpath, relation):
     return None
 
 
+def copy_http(http):
+    """
+    Returns an http object for a worker thread that has the
+    credentials, certificates, cache and settings of 'http'.
+    An httplib2.Http keeps one connection per host and must
+    not be used from two threads at once, so the copy gets
+    connections of its own. A PooledHttp can be shared
+    between threads and is returned as it is.
+
+    As the 'http_factory' of get_many() and the other bulk
+    functions, which is the default, each worker uses a copy
+    of the http object of each Context it is handed.
+    """
+    if isinstance(http, httplib2.PooledHttp):
+        return http
+    worker = copy.copy(http)
+    if isinstance(http, httplib2.Http):
+        worker.connections = {}
+    return worker
+
 class Context(object):
     """
     Encapsulates the current service documents,
     the current collection and the current 
     entry. Can be picked and un-pickled to
     achieve persistence of context.
+
+    Contexts are created for every collection and entry
+    that is iterated over, so they are kept small. Use
+    derive() to get a Context for another collection or
+    entry, it shares the http object and the parent URIs
+    of this Context, and never changes this Context.
     """
-    _service = None
-    _collection = None 
-    _entry = None
-    http = None
-    _collection_stack = []
+    __slots__ = ["_service", "_collection", "_entry", "http", "validators", "journal", "bus", "_collection_stack"]
 
-    def __init__(self, http = None, service=None, collection=None, entry=None):
+    def __init__(self, http = None, service=None, collection=None, entry=None, validators=None, bus=None, journal=None):
         """http is either an instance of httplib2.Http() or something that 
         acts like it. For this module the only tow functions that need to 
         be implemented are request() and add_credentials().
+
+        validators is an optional store from atompubbase.conditional
+        used to revalidate the documents retrieved with this Context.
+
+        journal is an optional journal from atompubbase.resumable
+        that records the progress of Collection.create_resumable()
+        so that failed uploads can be resumed.
+
+        bus is an optional events.Events that receives the events of
+        the instances using this Context instead of the global one.
+        It is not pickled along with the Context.
         """
-        self._collection_stack = []
+        self._collection_stack = ()
         if http:
             self.http = http
         else:
@@ -144,6 +313,51 @@ class Context(object):
         self._service = service
         self._collection = collection
         self._entry = entry
+        self.validators = validators
+        self.journal = journal
+        self.bus = bus
+
+    def derive(self, collection=None, entry=None):
+        """
+        Returns a new Context with the same service document,
+        http object, validators and journal as this one. If 'collection' 
+        is given the new Context is for that collection and has
+        no entry, otherwise it keeps this collection. If 'entry'
+        is given the new Context is for that entry. The 
+        new Context also shares the event bus of this one.
+        """
+        context = self.__class__.__new__(self.__class__)
+        context.http = self.http
+        context.validators = self.validators
+        context.journal = self.journal
+        context.bus = self.bus
+        context._service = self._service
+        if collection is None:
+            context._collection = self._collection
+            context._collection_stack = self._collection_stack
+            context._entry = self._entry
+        else:
+            context._collection = collection
+            context._collection_stack = ()
+            context._entry = None
+        if entry is not None:
+            context._entry = entry
+        return context
+
+    __copy__ = derive
+
+    def __getstate__(self):
+        return (self.http, self.validators, self._service, self._collection, self._entry, self._collection_stack, self.journal)
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            # Contexts pickled before Context had slots.
+            state = (state.get("http"), None, state.get("_service"), state.get("_collection"),
+                     state.get("_entry"), tuple(state.get("_collection_stack", ())))
+        (self.http, self.validators, self._service, self._collection, self._entry, self._collection_stack) = state[:6]
+        # Contexts pickled before journals were added have no journal.
+        self.journal = len(state) > 6 and state[6] or None
+        self.bus = None
 
     def _get_service(self):
         return self._service
@@ -151,7 +365,7 @@ class Context(object):
     def _set_service(self, service):
         self._service = service
         self._collection = None 
-        self._collection_stack = [] 
+        self._collection_stack = () 
         self._entry = None 
 
     service = property(_get_service, _set_service, None, "The URI of the Service Document. None if not set yet.")
@@ -161,7 +375,7 @@ class Context(object):
 
     def _set_collection(self, collection):
         self._collection = collection
-        self._collection_stack = []
+        self._collection_stack = ()
         self._entry = None 
 
     collection = property(_get_collection, _set_collection, None, "The URI of the collection. None if not set yet.")
@@ -193,7 +407,7 @@ class Context(object):
         change to a different collection and then pop back
         to the older collection when you are done.
         """
-        self._collection_stack.append((self._collection, self._entry))
+        self._collection_stack = self._collection_stack + ((self._collection, self._entry),)
         self._collection = uri
         self._entry = None 
 
@@ -201,7 +415,8 @@ class Context(object):
         """
         See collpush.
         """
-        self._collection, self._entry = self._collection_stack.pop()
+        self._collection, self._entry = self._collection_stack[-1]
+        self._collection_stack = self._collection_stack[:-1]
 
     
 
@@ -230,18 +445,21 @@ class Service(object):
         Returns a tuple of the HTTP response headers
         and the body.
         """
-        headers, body = self.context.http.request(self.context.service, headers=headers)
+        headers, body = conditional_request(self.context, self.context.service, headers)
+        self._record(headers, body)
+        return (headers, body)
+
+    def _record(self, headers, body):
         if headers.status == 200:
             self.representation = body
-            try:
-                self._etree = fromstring(body)
-            except ExpatError:
-                raise ParseException(headers, body)
-        return (headers, body)
+            self._etree = parse(self.context.service, headers, body, self.context.validators)
 
     def etree(self):
         """
         Returns an ElementTree representation of the Service Document.
+        If model.tree_cache is set, or the Context has a validator
+        store, the tree may be shared with other instances and
+        must not be modified; copy.deepcopy() it first.
         """
         if not self._etree:
             self.get()
@@ -263,9 +481,7 @@ class Service(object):
                 accept_type.append("application/atom+xml")
             coll_type = [t for t in accept_type if mimeparse.best_match([t], mimerange)] 
             if coll_type:
-                context = copy.copy(self.context)
-                context.collection = absolutize(self.context.service, coll.get('href')) 
-                yield context
+                yield self.context.derive(collection=absolutize(self.context.service, coll.get('href')))
 
     def iter(self):
         """
@@ -314,35 +530,52 @@ class Collection(object):
     def etree(self):
         """
         Returns an ElementTree representation of the 
-        current page of the collection.
+        current page of the collection. If model.tree_cache
+        is set, or the Context has a validator store, the
+        tree may be shared with other instances and must
+        not be modified; copy.deepcopy() it first.
         """
         if not self.representation:
             self.get()
         return self._etree
 
-    def _record_next(self, base_uri, headers, body):
-        if headers.status == 200:
+    def _fetch(self, uri, headers, body, streaming):
+        if streaming:
+            # A body that is never held whole can't be kept
+            # in the validator store.
+            return self._context.http.request(uri, headers=headers, body=body, stream=True)
+        return conditional_request(self._context, uri, headers, body)
+
+    def _record_next(self, base_uri, headers, body, streaming=False):
+        if streaming:
+            # The page is parsed incrementally by _stream_page().
+            self.representation = self._etree = self.next = None
+        elif headers.status == 200:
             self.representation = body
-            try:
-                self._etree = fromstring(body)
-            except ExpatError:
-                raise ParseException(headers, body)
+            self._etree = parse(base_uri, headers, body, self._context.validators)
             self.next = link_value(self._etree, ".", "next")
             if self.next:
                 self.next = absolutize(base_uri, self.next) 
+            record = metrics.current()
+            if record is not None:
+                record.entries = len(self._etree.findall(ATOM_ENTRY))
         else:
-            self.representation = self._etree = selfnext = None
+            self.representation = self._etree = self.next = None
 
-    def get(self, headers=None, body=None):
+    def get(self, headers=None, body=None, streaming=False):
         """
         Retrieves the first feed in a paged series of 
-        collection documents.
+        collection documents. If 'streaming' is True the
+        body is returned as a file-like object, as with
+        httplib2.Http's 'stream' argument, the feed is not
+        parsed and 'next' is left for the caller to set,
+        see iter_entry().
 
         Returns a tuple of the HTTP response headers
         and the body.
         """
-        headers, body = self._context.http.request(self._context.collection, headers=headers, body=body)
-        self._record_next(self._context.collection, headers, body)
+        headers, body = self._fetch(self._context.collection, headers, body, streaming)
+        self._record_next(self._context.collection, headers, body, streaming)
         return (headers, body)
 
     def has_next(self):
@@ -353,104 +586,291 @@ class Collection(object):
         """
         return self.next != None
 
-    def get_next(self, headers=None, body=None):
+    def get_next(self, headers=None, body=None, streaming=False):
         """
         Collections can be paged across many
         Atom feeds. Get's the next feed in the
-        paging.
+        paging. See get() for 'streaming'.
 
         Returns a tuple of the HTTP response headers
         and the body.
         """
-        headers, body = self._context.http.request(self.next, headers=headers, body=body)
-        self._record_next(self.next, headers, body)
+        headers, body = self._fetch(self.next, headers, body, streaming)
+        self._record_next(self.next, headers, body, streaming)
         return (headers, body)
 
-    def create(self, headers=None, body=None):
+    def create(self, headers=None, body=None, path=None):
         """
         Create a new member in the collection.
         Can be used to create members of regular
         and media collections. Be sure to set the 
         'content-type' header appropriately.
 
+        The body may be a string, an open file or an
+        mmap, or 'path' may name a file to upload.
+        See upload_request().
+
+        Returns a tuple of the HTTP response headers
+        and the body.
+        """
+        headers, body = upload_request(self, "create", self._context.collection, "POST", headers, body, path)
+        return (headers, body)
+
+    def create_resumable(self, headers=None, body=None, path=None, key=None, chunk_size=resumable.DEFAULT_CHUNK_SIZE, retries=3, backoff=1.0):
+        """
+        Create a new member of a media collection, sending
+        the media in ranges of 'chunk_size' bytes so that an
+        upload that fails part way through can be resumed.
+        Progress is recorded under 'key' in the journal of
+        the Context. Failures are retried as described in
+        resumable.upload(). Requires a server that supports
+        the resumable upload protocol, see atompubbase.resumable.
+
         Returns a tuple of the HTTP response headers
         and the body.
         """
-        headers, body = self._context.http.request(self._context.collection, method="POST", headers=headers, body=body)
+        headers, body = resumable.upload(self, headers, body, path, self._context.journal, key, chunk_size, retries, backoff)
         return (headers, body)
 
-    def entry_create(self, headers=None, body=None):
+    def entry_create(self, headers=None, body=None, path=None):
         """
         Convenience method that returns an Entry object
         if the create has succeeded, or None if it fails.
         """
-        headers, body = self._context.http.request(self._context.collection, method="POST", headers=headers, body=body)
+        headers, body = upload_request(self, "entry_create", self._context.collection, "POST", headers, body, path)
         if headers.status == 201 and 'location' in headers:
-            context = copy.copy(self._context)
-            context.entry = headers['location']
-            return context
+            return self._context.derive(entry=headers['location'])
         else:
             return None
 
-    def iter(self):
+    def _pages(self, readahead=0):
+        """
+        Returns a generator that steps this Collection
+        through every page of the collection, yielding
+        the ElementTree of each page in turn. A page that
+        is not retrieved with a 200 ends the iteration.
+
+        If 'readahead' is greater than zero then pages
+        are fetched and parsed on a background thread,
+        which starts on the next page as soon as the current
+        one is parsed and keeps at most 'readahead' parsed
+        pages buffered. The http object of the Context is then
+        used from that thread, so it must be safe to share 
+        if requests are made through it while iterating.
+        """
+        if not readahead:
+            self.get()
+            while True:
+                if self._etree is not None:
+                    yield self._etree
+                if self.has_next():
+                    self.get_next()
+                else:
+                    break
+            return
+
+        pages = Queue.Queue(readahead)
+        done = threading.Event()
+        fetcher = self.__class__(self._context)
+
+        def put(item):
+            while not done.isSet():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return
+                except Queue.Full:
+                    pass
+
+        def fetch():
+            try:
+                fetcher.get()
+                while not done.isSet():
+                    put(("page", (fetcher.representation, fetcher._etree, fetcher.next)))
+                    if fetcher._etree is None or not fetcher.has_next():
+                        break
+                    fetcher.get_next()
+            except:
+                put(("error", sys.exc_info()))
+            put(("done", None))
+
+        thread = threading.Thread(target=fetch)
+        thread.setDaemon(True)
+        thread.start()
+        try:
+            while True:
+                kind, value = pages.get()
+                if kind == "done":
+                    break
+                elif kind == "error":
+                    raise value[0], value[1], value[2]
+                self.representation, self._etree, self.next = value
+                if self._etree is not None:
+                    yield self._etree
+        finally:
+            done.set()
+
+    def iter(self, readahead=0):
         """
         Returns in iterable that produces a Context 
         object for every Entry in the collection.
+        See _pages() for the meaning of 'readahead'.
         """
-        self.get()
-        while True:
-            for entry in self._etree.findall(ATOM_ENTRY):
-                context = copy.copy(self._context)
+        for page in self._pages(readahead):
+            for entry in page.findall(ATOM_ENTRY):
                 edit_link = link_value(entry, ".", "edit")
-                context.entry = absolutize(self._context.collection, edit_link) 
-                yield context
-            if self.has_next():
-                self.get_next()
-            else:
-                break
+                yield self._context.derive(entry=absolutize(self._context.collection, edit_link))
 
-    def iter_entry(self):
+    def _stream_page(self, base_uri, headers, body):
+        """
+        Incrementally parse one page of the collection, yielding
+        each atom:entry as soon as its end tag has been parsed.
+        Entries are cleared and dropped from the feed element once
+        the consumer moves on, and self.next is set from the 'next'
+        link wherever it appears in the feed. The body is
+        a file-like object, which is closed once it is done.
+        """
+        depth = 0
+        feed = None
+        try:
+            if headers.status != 200:
+                return
+            for event, element in iterparse(body, events=("start", "end")):
+                if event == "start":
+                    if feed is None:
+                        feed = element
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth != 1:
+                    continue
+                if element.tag == ATOM_ENTRY:
+                    yield element
+                    element.clear()
+                    feed.remove(element)
+                elif element.tag == LINK and element.get('rel') == "next":
+                    self.next = absolutize(base_uri, element.get('href'))
+        except (ExpatError, SyntaxError):
+            raise ParseException(headers, body)
+        finally:
+            body.close()
+
+    def iter_entry(self, streaming=False, readahead=0):
         """
         Returns in iterable that produces an elementtree
         Entry for every Entry in the collection. Note that this
         Entry is the possibly incomplete Entry in the collection
-        feed.
+        feed. It is part of the tree of the page, which may be
+        shared, see etree(), so it must not be modified.
+
+        If 'streaming' is True then each page is parsed 
+        incrementally as it is read from the connection, and
+        neither the whole page nor an ElementTree of it is
+        ever held in memory. Each Entry is cleared once the
+        next one is requested, so copy out anything you need
+        to keep before advancing. The http object of the
+        Context must then support httplib2.Http's 'stream'
+        argument, and the pages are not revalidated through
+        the validator store of the Context.
+
+        If 'readahead' is greater than zero then pages are
+        prefetched on a background thread, see _pages().
+        Streaming and read-ahead can not be combined.
         """
-        self.get()
+        if not streaming:
+            for page in self._pages(readahead):
+                for entry in page.findall(ATOM_ENTRY):
+                    yield entry
+            return
+        if readahead:
+            raise ValueError("readahead can not be combined with streaming")
+        base_uri = self._context.collection
+        headers, body = self.get(streaming=True)
         while True:
-            for entry in self._etree.findall(ATOM_ENTRY):
+            for entry in self._stream_page(base_uri, headers, body):
                 yield entry
+            del body
             if self.has_next():
-                self.get_next()
+                base_uri = self.next
+                headers, body = self.get_next(streaming=True)
             else:
                 break
 
+    def iter_member(self, readahead=0):
+        """
+        Returns an iterable that produces an Entry for every
+        member of the collection, seeded with the links of
+        the copy of the entry in the collection feed, so that
+        its media can be retrieved or updated without first
+        retrieving the entry. See Entry.
+        """
+        for page in self._pages(readahead):
+            for element in page.findall(ATOM_ENTRY):
+                edit_link = link_value(element, ".", "edit")
+                yield Entry(self._context.derive(entry=absolutize(self._context.collection, edit_link)), element)
+
+    def fetch_entries(self, max_workers=4, ordered=True, http_factory=copy_http, readahead=0):
+        """
+        Retrieve the full representation of every member
+        of the collection concurrently. See get_many().
+        """
+        return get_many(self.iter(readahead), max_workers, ordered, http_factory)
+
 
 
 
 
 class Entry(object):
-    def __init__(self, context_or_uri):
+    def __init__(self, context_or_uri, element=None):
         """
         Create an Entry from either the URI of the
         entry edit URI, or from a Context object.
+
+        'element' is the atom:entry element from the collection
+        feed, see Collection.iter_member(). If it has an
+        edit-media link the Entry takes it from there, so
+        has_media(), get_media() and put_media() do not
+        retrieve the entry. Many servers leave the link out
+        of the feed, so without one the entry is retrieved
+        as usual. The feed copy may be incomplete and carries
+        no ETag, so etree() and put() always retrieve the
+        entry first.
         """
         self._context = isinstance(context_or_uri, Context) and context_or_uri or Context(entry=context_or_uri) 
-        self.representation = None
-        self._etree = None
-        self.edit_media = None
+        self._clear()
+        if element is not None:
+            base = self._context.collection or self._context.entry
+            self.edit_media = absolutize(base, link_value(element, ".", "edit-media"))
+            self._seeded = self.edit_media is not None
 
     def _clear(self):
         self.representation = None
         self._etree = None
+        self._shared = False
+        self._seeded = False
         self.edit_media = None
+        self.etag = None
+
+    def _require_links(self):
+        """
+        Retrieve the entry, unless it has been retrieved or
+        its edit-media link was seeded from the collection feed.
+        """
+        if not self.representation and not self._seeded:
+            self.get()
 
     def etree(self):
         """
         Returns an ElementTree representation of the Entry.
+        The tree belongs to this Entry and can be modified
+        before calling put().
         """
         if not self.representation:
             self.get()
+        if self._shared:
+            # Copy on write, the parsed tree is shared through
+            # tree_cache or the trees of the validator store.
+            self._etree = copy.deepcopy(self._etree)
+            self._shared = False
         return self._etree
 
     def context(self):
@@ -464,35 +884,42 @@ class Entry(object):
         """
         Retrieve the representation for this entry.
         """
-        headers, body = self._context.http.request(self._context.entry, headers=headers)
-        self.representation = body
+        headers, body = conditional_request(self._context, self._context.entry, headers)
+        self._record(headers, body)
+        return (headers, body)
 
-        try:
-            self._etree = fromstring(body)
-        except ExpatError:
-            raise ParseException(headers, body)
-        
+    def _record(self, headers, body):
+        self.representation = body
+        self._seeded = False
+        self.etag = headers.get('etag')
+        self._etree = parse(self._context.entry, headers, body, self._context.validators)
+        self._shared = _shared(self._context.validators, headers)
 
         self.edit_media = absolutize(self._context.entry, link_value(self._etree, ".", "edit-media")) 
 
-        return (headers, body)
-
     def has_media(self):
         """
         Returns True if this is a Media Link Entry.
         """
-        if not self.representation:
-            self.get()
+        self._require_links()
         return self.edit_media != None
 
-    def get_media(self, headers=None, body=None):
+    def get_media(self, headers=None, body=None, stream=False):
         """
         If this entry is a Media Link Entry, then retrieve
         the associated media.
+
+        If 'stream' is True the body returned is a file-like
+        object that reads the media from the connection as it
+        is consumed, instead of a string. Close it when done.
+        The http object of the Context must support
+        httplib2.Http's 'stream' argument.
         """
-        if not self.representation:
-            self.get()
-        headers, body = self._context.http.request(self.edit_media, headers=headers)
+        self._require_links()
+        if stream:
+            headers, body = self._context.http.request(self.edit_media, headers=headers, stream=True)
+        else:
+            headers, body = self._context.http.request(self.edit_media, headers=headers)
         return (headers, body)
 
     def put(self, headers=None, body=None):
@@ -500,6 +927,9 @@ class Entry(object):
         Update the entry on the server. If the body to send
         is not supplied then the internal elementtree element
         will be serialized and sent to the server.
+        To only update the entry if it has not changed
+        since it was retrieved pass its ETag in an If-Match
+        header, as update_many() does.
         """
         if headers == None:
             headers = {}
@@ -514,14 +944,15 @@ class Entry(object):
             self._clear()
         return (headers, body)
 
-    def put_media(self, headers=None, body=None):
+    def put_media(self, headers=None, body=None, path=None):
         """
         If this entry is a Media Link Entry, then update 
-        the associated media.
+        the associated media. The body may be a string, an
+        open file or an mmap, or 'path' may name a file to
+        upload. See upload_request().
         """
-        if not self.representation:
-            self.get()
-        headers, body = self._context.http.request(self.edit_media, headers=headers, method="PUT", body=body)
+        self._require_links()
+        headers, body = upload_request(self, "put_media", self.edit_media, "PUT", headers, body, path)
         if headers.status < 300:
             self._clear()
         return (headers, body)
@@ -535,6 +966,245 @@ class Entry(object):
             self._clear()
         return (headers, body)
 
+def _parallel(items, work, max_workers, ordered, http_factory):
+    """
+    Call work(http_for, item) for every item using a pool
+    of 'max_workers' threads. http_for(http) returns the
+    http object the worker uses in place of 'http', the one
+    of the item's Context: a copy_http() of it, made once
+    per worker, if 'http_factory' is copy_http, the worker's
+    own http object from 'http_factory', or 'http' itself if
+    'http_factory' is None.
+    No more than twice 'max_workers' items are taken from 
+    'items' ahead of the results being consumed.
+
+    Returns a generator of the values returned from work(),
+    in the order of 'items' if 'ordered' is True.
+    """
+    requests = Queue.Queue()
+    results = Queue.Queue()
+    done = threading.Event()
+    # One slot for every item taken from 'items' whose
+    # result has not been consumed yet.
+    slots = threading.Semaphore(max_workers * 2)
+
+    def feed():
+        try:
+            iterator = iter(items)
+            index = 0
+            while True:
+                slots.acquire()
+                if done.isSet():
+                    break
+                try:
+                    item = iterator.next()
+                except StopIteration:
+                    break
+                requests.put((index, item))
+                index += 1
+        except:
+            results.put(("error", sys.exc_info()))
+        for i in range(max_workers):
+            requests.put(None)
+
+    def run():
+        try:
+            try:
+                http_for = _http_for(http_factory)
+                while True:
+                    request = requests.get()
+                    if request is None:
+                        break
+                    index, item = request
+                    results.put(("result", (index, work(http_for, item))))
+            except:
+                results.put(("error", sys.exc_info()))
+        finally:
+            results.put(("done", None))
+
+    threads = [threading.Thread(target=feed)] + [threading.Thread(target=run) for i in range(max_workers)]
+    for thread in threads:
+        thread.setDaemon(True)
+        thread.start()
+
+    pending = {}
+    next_index = 0
+    finished = 0
+    try:
+        while finished < max_workers:
+            kind, value = results.get()
+            if kind == "done":
+                finished += 1
+            elif kind == "error":
+                raise value[0], value[1], value[2]
+            elif not ordered:
+                yield value[1]
+                slots.release()
+            else:
+                pending[value[0]] = value[1]
+                while next_index in pending:
+                    yield pending.pop(next_index)
+                    slots.release()
+                    next_index += 1
+    finally:
+        done.set()
+        slots.release()
+
+
+def _http_for(http_factory):
+    if http_factory is None:
+        return lambda http: http
+    if http_factory is copy_http:
+        copies = {}
+        def http_for(http):
+            if id(http) not in copies:
+                copies[id(http)] = (http, copy_http(http))
+            return copies[id(http)][1]
+        return http_for
+    worker_http = http_factory()
+    return lambda http: worker_http
+
+def get_many(contexts, max_workers=4, ordered=True, http_factory=copy_http):
+    """
+    Retrieve the Entry for every Context in 'contexts'
+    using a pool of 'max_workers' threads. By default each
+    worker uses a copy of the http object of each Context,
+    see copy_http(), so credentials, caching and the other
+    settings carry over. A custom 'http_factory' replaces
+    that: each worker gets its own http object from it,
+    which must then add any credentials, caching, etc.
+    If 'http_factory' is None the http object of each
+    Context is used, which must then be safe to share
+    between threads, like an httplib2.PooledHttp.
+
+    Returns a generator of (entry, error) tuples, where 'entry'
+    is an Entry on which get() has been called and 'error'
+    is None or the exception raised while retrieving it. 
+    A failed retrieval does not stop the rest of the batch.
+    Results come back in the order of 'contexts' if 'ordered'
+    is True, otherwise in the order they complete.
+    """
+    def work(http_for, context):
+        worker_context = context.derive()
+        worker_context.http = http_for(context.http)
+        entry = Entry(worker_context)
+        error = None
+        try:
+            entry.get()
+        except Exception, e:
+            error = e
+        worker_context.http = context.http
+        return (entry, error)
+    return _parallel(contexts, work, max_workers, ordered, http_factory)
+
+
+def batch(operations, max_workers=4, ordered=True, http_factory=copy_http):
+    """
+    Call a method on many Entry or Collection instances,
+    such as for deleting or updating entries in bulk, using
+    a pool of 'max_workers' threads. At most 'max_workers'
+    requests are in flight at once, each worker using the
+    persistent connections of its own copy of the http
+    object of the instance, or of the http object from
+    'http_factory', or the http object of the instance
+    itself if 'http_factory' is None, see get_many().
+
+    Each operation is a tuple of (instance, methodname) or 
+    (instance, methodname, headers, body):
+
+        batch([(entry, "delete") for entry in stale])
+        batch([(entry, "put", None, body) for entry, body in changes])
+
+    An instance must not appear in more than one operation.
+
+    Returns a generator of (operation, response, error) tuples,
+    where 'response' is the (headers, body) tuple returned from
+    the method, or None if it raised 'error'. Results come back
+    in the order of 'operations' if 'ordered' is True, otherwise
+    in the order they complete.
+    """
+    def work(http_for, operation):
+        instance, methodname = operation[:2]
+        args = operation[2:]
+        context = instance._context
+        http = http_for(context.http)
+        if http is not context.http:
+            instance._context = context.derive()
+            instance._context.http = http
+        try:
+            try:
+                return (operation, getattr(instance, methodname)(*args), None)
+            except Exception, e:
+                return (operation, None, e)
+        finally:
+            instance._context = context
+    return _parallel(operations, work, max_workers, ordered, http_factory)
+
+
+UPDATED = "updated"
+CONFLICT = "conflict"
+FAILED = "failed"
+
+# The outcome of one update made by update_many().
+Update = namedtuple("Update", "context outcome attempts headers error")
+
+
+def update_many(updates, max_workers=4, ordered=True, http_factory=copy_http, retries=3):
+    """
+    Apply changes to many entries using a pool of 'max_workers'
+    threads, see get_many() for 'ordered' and 'http_factory'.
+
+    Each update is a tuple of (context, mutate). The entry of
+    the Context is retrieved, mutate() is called with its
+    ElementTree element, which it changes in place, and
+    the entry is PUT back with If-Match set to its ETag.
+    If someone else has changed the entry in the meantime
+    the server answers 412, and the entry is retrieved
+    again and mutate() is applied to the new version, up
+    to 'retries' times. The entries that did not conflict
+    are not retrieved again. An entry with a weak ETag, or
+    none, is PUT without If-Match, since a weak ETag can't
+    be used in If-Match.
+
+    Returns a generator of Update tuples of the Context,
+    the outcome, which is UPDATED, CONFLICT if the entry still
+    conflicted after the last retry, or FAILED, the number of
+    PUTs made, the headers of the last response and the
+    exception raised, if any.
+    """
+    def work(http_for, update):
+        context, mutate = update
+        worker_context = context.derive()
+        worker_context.http = http_for(context.http)
+        entry = Entry(worker_context)
+        attempts = 0
+        headers = None
+        try:
+            # Revalidate after a conflict, past any cache.
+            get_headers = None
+            while True:
+                try:
+                    headers, body = entry.get(get_headers)
+                except ParseException, e:
+                    # Not retrieved with a 200.
+                    return Update(context, FAILED, attempts, e.headers, e)
+                mutate(entry.etree())
+                put_headers = {}
+                if entry.etag and not entry.etag.startswith("W/"):
+                    put_headers['if-match'] = entry.etag
+                headers, body = entry.put(put_headers)
+                attempts += 1
+                if headers.status < 300:
+                    return Update(context, UPDATED, attempts, headers, None)
+                if headers.status != 412:
+                    return Update(context, FAILED, attempts, headers, None)
+                if attempts > retries:
+                    return Update(context, CONFLICT, attempts, headers, None)
+                get_headers = {"cache-control": "no-cache"}
+        except Exception, e:
+            return Update(context, FAILED, attempts, headers, e)
+    return _parallel(updates, work, max_workers, ordered, http_factory)
+
 
 def init_event_handlers():
     """
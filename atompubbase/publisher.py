@@ -0,0 +1,144 @@
+"""
+Creating many entries in a collection.
+
+A Publisher POSTs entries to a collection from a pool of
+worker threads, each with its own http object, so that
+several requests are in flight at once:
+
+    publisher = Publisher(Collection(context), max_workers=8)
+    for item, context, error in publisher.publish(read_entries()):
+        if error is not None:
+            log(item, error)
+
+The entries are taken from the iterable passed to publish()
+only as the workers become free, and each one is serialized
+by the worker that sends it, so the iterable can be a
+generator of any length. No more than twice 'max_workers'
+entries are held at once, and if the results are not
+consumed the workers wait for them.
+
+A POST is not idempotent, so the only failures that are
+retried are those where the server cannot have created the
+entry: a refused connection and a response of 408, 429 or
+503. They are retried after a random delay that grows
+with each attempt, or after the delay in the Retry-After
+header of the response.
+"""
+import time
+import errno
+import random
+import socket
+from model import Collection, copy_http, _parallel
+
+try:
+    from xml.etree.ElementTree import tostring
+except:
+    from elementtree.ElementTree import tostring
+
+ATOM_ENTRY_TYPE = "application/atom+xml;type=entry"
+
+# Responses that mean the request was not acted on.
+RETRY_STATUS = set([408, 429, 503])
+
+
+class PublishError(Exception):
+    """
+    Raised, or returned from Publisher.publish(), when the
+    server does not create the entry.
+    """
+    def __init__(self, headers, body):
+        Exception.__init__(self, "Entry not created: %s" % headers.status)
+        self.headers = headers
+        self.body = body
+
+
+def serialize(item):
+    """
+    The default serializer, which sends strings as they are
+    and serializes ElementTree elements.
+    """
+    if isinstance(item, basestring):
+        return item
+    return tostring(item)
+
+
+class Publisher(object):
+    def __init__(self, collection_or_context, max_workers=4, retries=3, backoff=0.5, max_backoff=30.0,
+                 headers=None, serializer=serialize, ordered=False, http_factory=copy_http):
+        """
+        Create a Publisher for a Collection, or for the
+        collection of a Context.
+
+        Entries are sent by 'max_workers' threads, each
+        with its own copy of the http object of the
+        collection's Context, or a custom http object from
+        'http_factory', which replaces it, see model.get_many(). Failures are retried up to 'retries'
+        times, the n'th time after a random delay of up to
+        'backoff' times 2 to the n seconds, but never more
+        than 'max_backoff' seconds.
+
+        'headers' are sent with every entry, and by default
+        give the content-type of an Atom Entry. 'serializer'
+        is called with each item to get the body to send.
+        """
+        if isinstance(collection_or_context, Collection):
+            self.collection = collection_or_context
+        else:
+            self.collection = Collection(collection_or_context)
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.headers = headers or {"content-type": ATOM_ENTRY_TYPE}
+        self.serializer = serializer
+        self.ordered = ordered
+        self.http_factory = http_factory
+
+    def _delay(self, attempt, retry_after):
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def _create(self, http_for, item):
+        context = self.collection.context().derive()
+        context.http = http_for(context.http)
+        collection = Collection(context)
+        try:
+            body = self.serializer(item)
+        except Exception, e:
+            return (item, None, e)
+        attempt = 0
+        while True:
+            try:
+                headers, content = collection.create(dict(self.headers), body)
+            except socket.error, e:
+                if e.errno != errno.ECONNREFUSED or attempt >= self.retries:
+                    return (item, None, e)
+                delay = self._delay(attempt, None)
+            except Exception, e:
+                return (item, None, e)
+            else:
+                if headers.status == 201 and 'location' in headers:
+                    return (item, self.collection.context().derive(entry=headers['location']), None)
+                if headers.status not in RETRY_STATUS or attempt >= self.retries:
+                    return (item, None, PublishError(headers, content))
+                delay = self._delay(attempt, headers.get('retry-after'))
+            attempt += 1
+            time.sleep(delay)
+
+    def publish(self, items):
+        """
+        Create an entry in the collection for every item
+        in 'items'.
+
+        Returns a generator of (item, context, error) tuples,
+        where 'context' is a Context for the new entry, or
+        None if it was not created and 'error' is the
+        exception raised or a PublishError. Results come back
+        in the order they complete, or in the order of 'items'
+        if the Publisher is 'ordered'.
+        """
+        return _parallel(items, self._create, self.max_workers, self.ordered, self.http_factory)
@@ -0,0 +1,303 @@
+"""
+Resumable uploads of media to a collection.
+
+Collection.create() sends the media in a single POST, so a
+connection that drops part way through means sending all of
+it again. Collection.create_resumable() instead sends the
+media in ranges, using the resumable upload protocol of the
+GData APIs, and records how far the server has acknowledged
+in a journal so that a failed upload carries on from there:
+
+    c = Context(http, collection=uri, journal=DbmJournal("uploads.db"))
+    collection = Collection(c)
+    headers, body = collection.create_resumable(
+        {"content-type": "video/mp4", "slug": "holiday"}, path="holiday.mp4")
+
+The protocol goes like this. The upload session is started
+with a POST to the collection that has an empty body and
+carries the type and length of the media in the
+X-Upload-Content-Type and X-Upload-Content-Length headers.
+The server answers with the URI of the session in the
+Location header. Each range of the media is then PUT to that
+URI with a Content-Range header. The server answers 308 with
+a Range header of the bytes it has received so far, or with
+201 and the new member once it has all of them. A PUT with
+an empty body and a Content-Range of "bytes */length" asks
+the server how much it has received, which is how an upload
+is resumed.
+
+Each journal maps a key to a tuple of (session URI, offset,
+length), where offset is the number of bytes the server has
+acknowledged.
+"""
+import os
+import time
+import random
+import anydbm
+import marshal
+import socket
+import httplib
+import events
+from StringIO import StringIO
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+# A 308 is not a redirect in this protocol.
+RESUME_INCOMPLETE = 308
+
+
+class UploadError(Exception):
+    """
+    Raised when the server refuses to start an upload session.
+    """
+    def __init__(self, headers, body):
+        Exception.__init__(self, "Could not start an upload session: %s" % headers.status)
+        self.headers = headers
+        self.body = body
+
+
+class MemoryJournal(object):
+    """
+    Keeps the journal in memory, so uploads can only be
+    resumed by the same process.
+    """
+    def __init__(self):
+        self._uploads = {}
+
+    def get(self, key):
+        """
+        Returns the (session, offset, length) tuple
+        stored for 'key', or None.
+        """
+        return self._uploads.get(key)
+
+    def set(self, key, session, offset, length):
+        self._uploads[key] = (session, offset, length)
+
+    def delete(self, key):
+        self._uploads.pop(key, None)
+
+
+class DbmJournal(object):
+    """
+    Keeps the journal in a dbm file.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._db = anydbm.open(filename, "c")
+
+    def __getstate__(self):
+        return self.filename
+
+    def __setstate__(self, filename):
+        self.__init__(filename)
+
+    def _key(self, key):
+        if isinstance(key, unicode):
+            return key.encode('utf-8')
+        return key
+
+    def get(self, key):
+        key = self._key(key)
+        if self._db.has_key(key):
+            return marshal.loads(self._db[key])
+        return None
+
+    def set(self, key, session, offset, length):
+        self._db[self._key(key)] = marshal.dumps((session, offset, length))
+        if hasattr(self._db, "sync"):
+            self._db.sync()
+
+    def delete(self, key):
+        key = self._key(key)
+        if self._db.has_key(key):
+            del self._db[key]
+
+    def close(self):
+        self._db.close()
+
+
+def journal_key(uri, path):
+    """
+    The journal key for uploading the file 'path' to the
+    collection 'uri'. The size and modification time of the
+    file are part of the key, so a file that has changed
+    is uploaded from the start.
+    """
+    info = os.stat(path)
+    return "%s %s %d %d" % (uri, os.path.abspath(path), info.st_size, int(info.st_mtime))
+
+
+def _length(body):
+    body.seek(0, 2)
+    length = body.tell()
+    body.seek(0)
+    return length
+
+
+def _acknowledged(headers):
+    """
+    The number of bytes the server has received,
+    from the Range header of a 308 response.
+    """
+    value = headers.get("range")
+    if not value:
+        return 0
+    return int(value.split("-")[-1]) + 1
+
+
+class _Upload(object):
+    def __init__(self, collection, headers, body, length, journal, key):
+        self.collection = collection
+        self.http = collection._context.http
+        self.headers = headers
+        self.body = body
+        self.length = length
+        self.journal = journal
+        self.key = key
+        self.session = None
+        self.offset = 0
+
+    def _checkpoint(self):
+        if self.key is not None:
+            self.journal.set(self.key, self.session, self.offset, self.length)
+
+    def forget(self):
+        if self.key is not None:
+            self.journal.delete(self.key)
+        self.session = None
+        self.offset = 0
+
+    def start(self):
+        headers = dict(self.headers)
+        headers["x-upload-content-length"] = str(self.length)
+        if "content-type" in headers:
+            headers["x-upload-content-type"] = headers.pop("content-type")
+        headers["content-length"] = "0"
+        response, content = self.http.request(self.collection._context.collection, method="POST", headers=headers, body="")
+        if response.status >= 300 or "location" not in response:
+            raise UploadError(response, content)
+        self.session = response["location"]
+        self.offset = 0
+        self._checkpoint()
+
+    def query(self):
+        """
+        Ask the server how much of the media it has, returning
+        the response if the upload turns out to be complete.
+        """
+        headers = {"content-range": "bytes */%d" % self.length, "content-length": "0"}
+        return self.http.request(self.session, method="PUT", headers=headers, body="")
+
+    def send(self, chunk_size):
+        self.body.seek(self.offset)
+        data = self.body.read(chunk_size)
+        if data:
+            content_range = "bytes %d-%d/%d" % (self.offset, self.offset + len(data) - 1, self.length)
+        else:
+            # Empty media has no range of bytes to send.
+            content_range = "bytes */%d" % self.length
+        headers = {"content-range": content_range, "content-length": str(len(data))}
+        if "content-type" in self.headers:
+            headers["content-type"] = self.headers["content-type"]
+        return self.http.request(self.session, method="PUT", headers=headers, body=data)
+
+    def acknowledged(self, response):
+        """
+        Record the offset from a 308 response, returning
+        True if the server has received more of the media.
+        """
+        offset = self.offset
+        self.offset = _acknowledged(response)
+        self._checkpoint()
+        events.bus_for(self.collection).trigger("PROGRESS", "create_resumable", self.collection, self.headers, (self.offset, self.length))
+        return self.offset > offset
+
+
+def _delay(attempt, backoff):
+    return random.uniform(0, backoff * (2 ** attempt))
+
+
+def upload(collection, headers=None, body=None, path=None, journal=None, key=None, chunk_size=DEFAULT_CHUNK_SIZE, retries=3, backoff=1.0):
+    """
+    Upload media to a collection, 'chunk_size' bytes at a
+    time, resuming the upload recorded in 'journal' under
+    'key' if there is one. The body is a string or a
+    seekable file, or 'path' names the file to upload, in
+    which case 'key' defaults to journal_key(). Without a
+    journal or a key the upload is only resumed within
+    this call.
+
+    The upload is resumed after up to 'retries' failures in
+    a row: a dropped connection, a server error, a range
+    that the server did not take, or an expired session,
+    which starts the upload over. The n'th retry waits for
+    a random delay of up to 'backoff' times 2 to the n
+    seconds. After that the exception is raised, or the
+    last response is returned, and the upload can be
+    resumed from the journal later.
+
+    Returns a tuple of the HTTP response headers and the body
+    of the final response.
+    """
+    headers = dict(headers or {})
+    f = None
+    if path is not None:
+        f = body = open(path, "rb")
+        if key is None:
+            key = journal_key(collection._context.collection, path)
+    if isinstance(body, basestring):
+        body = StringIO(body)
+    if journal is None:
+        key = None
+    try:
+        upload = _Upload(collection, headers, body, _length(body), journal, key)
+        if key is not None:
+            state = journal.get(key)
+            if state is not None and state[2] == upload.length:
+                upload.session = state[0]
+                upload.offset = state[1]
+        failures = 0
+        query = False
+        while True:
+            try:
+                if upload.session is None:
+                    upload.start()
+                    continue
+                if query:
+                    # Find out what arrived before the failure.
+                    response, content = upload.query()
+                else:
+                    response, content = upload.send(chunk_size)
+            except (socket.error, httplib.HTTPException):
+                if failures >= retries:
+                    raise
+                failures += 1
+                query = True
+                time.sleep(_delay(failures, backoff))
+                continue
+            if response.status == RESUME_INCOMPLETE:
+                if upload.acknowledged(response):
+                    failures = 0
+                    query = False
+                    continue
+                if query:
+                    query = False
+                    continue
+            elif response.status in (404, 410):
+                # The session has expired, start over.
+                upload.forget()
+            elif response.status < 300:
+                upload.forget()
+                return (response, content)
+            elif response.status < 500:
+                return (response, content)
+            else:
+                query = True
+            if failures >= retries:
+                return (response, content)
+            failures += 1
+            time.sleep(_delay(failures, backoff))
+    finally:
+        if f is not None:
+            f.close()
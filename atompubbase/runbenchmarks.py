@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+"""
+Benchmarks for the model layer.
+
+The benchmarks run against MockHttp over fixtures that
+are generated into a temporary directory: a service document
+with many collections, and a collection of many pages of
+entries of varying sizes. Each benchmark runs in its own
+process so that the peak memory reported is its own, and
+so that the event handlers are only installed for the
+benchmarks that measure them.
+
+    python runbenchmarks.py                      # run everything
+    python runbenchmarks.py collection_iter      # run some
+    python runbenchmarks.py --save baseline.json
+    python runbenchmarks.py --compare baseline.json
+
+With --compare a benchmark whose throughput has dropped
+by more than --threshold percent is reported as a
+regression, and the exit status is non-zero.
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import resource
+import traceback
+import multiprocessing
+import Queue
+from optparse import OptionParser
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+# try to start in a consistent, predictable location
+if sys.path[0]:
+    os.chdir(sys.path[0])
+
+import model
+import events
+from model import Context, Service, Collection, Entry
+from mockhttp import MockHttp
+
+SERVICE_URI = "http://example.org/service.atomsvc"
+COLLECTION_URI = "http://example.org/bench/index.atom"
+
+# Sizes, in bytes, of the content of the generated entries.
+ENTRY_SIZES = [200, 2000, 20000]
+
+ENTRY = """<entry xmlns="http://www.w3.org/2005/Atom" xmlns:app="http://www.w3.org/2007/app">
+     <title>Entry %(n)d</title>
+     <link href="/bench/%(n)d" rel="edit" />
+     <id>http://example.org/bench/%(n)d</id>
+     <updated>2008-01-01T00:00:00Z</updated>
+     <app:edited>2008-01-01T00:00:00Z</app:edited>
+     <content type="text">%(content)s</content>
+   </entry>
+"""
+
+
+def write(directory, method, path, body, status=200):
+    fname = os.path.join(directory, method, path + ".file")
+    if not os.path.exists(os.path.dirname(fname)):
+        os.makedirs(os.path.dirname(fname))
+    f = file(fname, "w")
+    f.write("status: %d\r\n\r\n" % status)
+    f.write(body)
+    f.close()
+
+
+def make_fixtures(directory, collections, pages, entries):
+    """
+    Write a service document with 'collections' collections
+    and a collection of 'pages' pages of 'entries' entries
+    each, with every entry also available on its own.
+    """
+    workspace = "".join(["""<collection href="c%d/index.atom"><atom:title>Collection %d</atom:title></collection>""" % (i, i)
+        for i in range(collections)])
+    write(directory, "GET", "service.atomsvc", """<?xml version="1.0" encoding="utf-8"?>
+<service xmlns="http://www.w3.org/2007/app" xmlns:atom="http://www.w3.org/2005/Atom">
+  <workspace><atom:title>Bench</atom:title>%s</workspace>
+</service>""" % workspace)
+    n = 0
+    for page in range(pages):
+        body = []
+        for i in range(entries):
+            entry = ENTRY % {"n": n, "content": "x" * ENTRY_SIZES[n % len(ENTRY_SIZES)]}
+            body.append(entry)
+            write(directory, "GET", "bench/%d" % n, entry)
+            write(directory, "PUT", "bench/%d" % n, "")
+            n += 1
+        next = ""
+        if page < pages - 1:
+            next = """<link href="index.atom.%d" rel="next" />""" % (page + 1)
+        name = page and "bench/index.atom.%d" % page or "bench/index.atom"
+        write(directory, "GET", name, """<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom"><title>Bench</title><id>http://example.org/bench/</id>%s%s</feed>""" % (next, "".join(body)))
+    return n
+
+
+# Each benchmark makes one pass over the fixtures and
+# returns the number of operations it performed.
+
+def bench_service_iter_info(directory, options):
+    return len(list(Service(Context(MockHttp(directory), service=SERVICE_URI)).iter_info()))
+
+
+def bench_collection_iter(directory, options):
+    return len(list(Collection(Context(MockHttp(directory), collection=COLLECTION_URI)).iter()))
+
+
+def bench_collection_iter_entry(directory, options):
+    ops = 0
+    for entry in Collection(Context(MockHttp(directory), collection=COLLECTION_URI)).iter_entry():
+        ops += 1
+    return ops
+
+
+def bench_collection_iter_entry_streaming(directory, options):
+    ops = 0
+    for entry in Collection(Context(MockHttp(directory), collection=COLLECTION_URI)).iter_entry(streaming=True):
+        ops += 1
+    return ops
+
+
+def _entries(directory, options):
+    http = MockHttp(directory)
+    for n in range(options.pages * options.entries):
+        yield Entry(Context(http, entry="http://example.org/bench/%d" % n))
+
+
+def bench_entry_get(directory, options):
+    ops = 0
+    for entry in _entries(directory, options):
+        entry.get()
+        ops += 1
+    return ops
+
+
+def bench_entry_put(directory, options):
+    ops = 0
+    for entry in _entries(directory, options):
+        entry.put()
+        ops += 1
+    return ops
+
+
+def _register_callbacks():
+    def cb(headers, body, filters):
+        pass
+    events.clear()
+    for filter in ["PRE", "POST_GET", "POST_ENTRY", "ANY", "PUT_MEDIA"]:
+        events.register_callback(filter, cb)
+
+
+def bench_events_trigger(directory, options):
+    _register_callbacks()
+    entry = Entry("http://example.org/bench/0")
+    ops = 20000
+    for i in xrange(ops):
+        events.events.trigger("PRE", "get", entry, {}, None)
+    return ops
+
+
+def bench_entry_get_with_events(directory, options):
+    model.init_event_handlers()
+    _register_callbacks()
+    return bench_entry_get(directory, options)
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+BENCHMARKS = [name[len("bench_"):] for name in sorted(globals().keys()) if name.startswith("bench_")]
+
+
+def _run(name, directory, options, results):
+    try:
+        fn = globals()["bench_" + name]
+        elapsed = None
+        for i in range(options.repeat):
+            start = time.time()
+            ops = fn(directory, options)
+            elapsed = min(elapsed or sys.maxint, time.time() - start)
+        # ru_maxrss is in kilobytes on Linux.
+        results.put(("ok", (ops, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)))
+    except:
+        results.put(("error", traceback.format_exc()))
+
+
+def run(name, directory, options):
+    """
+    Run one benchmark in a child process and return a dictionary
+    of its operation count, best time over all the repeats,
+    throughput and peak memory. Raises BenchmarkError if the
+    benchmark fails.
+    """
+    results = multiprocessing.Queue()
+    child = multiprocessing.Process(target=_run, args=(name, directory, options, results))
+    child.start()
+    kind, value = None, None
+    while kind is None:
+        try:
+            kind, value = results.get(timeout=1)
+        except Queue.Empty:
+            if not child.is_alive():
+                # Killed before it could report, by a signal or os._exit().
+                raise BenchmarkError("%s exited with status %s" % (name, child.exitcode))
+    child.join()
+    if kind == "error":
+        raise BenchmarkError("%s failed:\n%s" % (name, value))
+    ops, elapsed, peak = value
+    return {"ops": ops, "seconds": elapsed, "ops_per_sec": ops / max(elapsed, 1e-9), "peak_kb": peak}
+
+
+def main():
+    parser = OptionParser(usage="%prog [options] [benchmark ...]")
+    parser.add_option("--collections", type="int", default=200, help="Number of collections in the service document.")
+    parser.add_option("--pages", type="int", default=10, help="Number of pages in the collection.")
+    parser.add_option("--entries", type="int", default=100, help="Number of entries on each page.")
+    parser.add_option("--repeat", type="int", default=5, help="Number of times to repeat each benchmark, the best time is kept.")
+    parser.add_option("--save", metavar="FILE", help="Store the results as a baseline in FILE.")
+    parser.add_option("--compare", metavar="FILE", help="Compare the results with the baseline in FILE.")
+    parser.add_option("--threshold", type="float", default=20.0, help="Percentage drop in throughput reported as a regression.")
+    options, names = parser.parse_args()
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error("Unknown benchmark '%s', choose from: %s" % (name, ", ".join(BENCHMARKS)))
+    names = names or BENCHMARKS
+
+    baseline = {}
+    if options.compare:
+        baseline = json.load(file(options.compare, "r"))["results"]
+
+    directory = tempfile.mkdtemp()
+    regressions = []
+    failures = []
+    results = {}
+    try:
+        make_fixtures(directory, options.collections, options.pages, options.entries)
+        print "%-36s %10s %12s %10s %8s" % ("benchmark", "ops", "ops/sec", "peak KB", "change")
+        for name in names:
+            try:
+                result = results[name] = run(name, directory, options)
+            except BenchmarkError, e:
+                print >>sys.stderr, e
+                failures.append(name)
+                continue
+            change = ""
+            if name in baseline:
+                delta = 100.0 * (result["ops_per_sec"] - baseline[name]["ops_per_sec"]) / baseline[name]["ops_per_sec"]
+                change = "%+.1f%%" % delta
+                if delta < -options.threshold:
+                    regressions.append(name)
+            print "%-36s %10d %12.1f %10d %8s" % (name, result["ops"], result["ops_per_sec"], result["peak_kb"], change)
+    finally:
+        shutil.rmtree(directory)
+
+    if options.save:
+        settings = dict([(key, getattr(options, key)) for key in ["collections", "pages", "entries", "repeat"]])
+        json.dump({"settings": settings, "results": results}, file(options.save, "w"), indent=2)
+    if failures:
+        print "Failed: " + ", ".join(failures)
+    if regressions:
+        print "Regressions: " + ", ".join(regressions)
+    if failures or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Incremental synchronization of a collection.
+
+RFC 5023 collections are ordered by app:edited, most
+recently edited first, so every member that has been
+created or changed since the last poll appears in front
+of the members that were already seen. CollectionSync
+remembers a high-water mark of (edited, id) and stops
+paging through the collection as soon as it reaches an
+entry it has already seen at, or older than, that mark.
+
+    sync = CollectionSync(Collection(context))
+    while True:
+        created, updated, deleted = sync.sync()
+        ...
+        pickle.dump(sync.state(), f)
+
+Deletions leave no trace in the feed, so they can
+only be found by walking every page. Call sync(full=True)
+now and then to pick them up.
+"""
+from model import Collection
+from util import APP, ATOM, get_date
+
+
+def edited(entry):
+    """
+    Returns the app:edited time of the entry in seconds
+    since the epoch, falling back to atom:updated,
+    or None if neither can be parsed.
+    """
+    for name in [APP("edited"), ATOM("updated")]:
+        try:
+            return get_date(entry, name)
+        except (ValueError, TypeError):
+            pass
+    return None
+
+
+class CollectionSync(object):
+    def __init__(self, collection_or_context, state=None, known=None):
+        """
+        Create a CollectionSync for a Collection, or for
+        the collection of a Context. 'state' is the value
+        returned from state() by an earlier CollectionSync
+        for the same collection.
+
+        'known' is where the edited time of every known
+        member is kept, a dict by default. Any object that
+        supports get(), 'in', iteration and getting, setting
+        and deleting items can be given instead, to keep them
+        in a database, say. The members in 'state' are added
+        to it.
+        """
+        if isinstance(collection_or_context, Collection):
+            self.collection = collection_or_context
+        else:
+            self.collection = Collection(collection_or_context)
+        # The (edited, id) of the most recently edited member seen.
+        self.high_water = None
+        # Maps the atom:id of every known member to its edited time.
+        self.known = known
+        if known is None:
+            self.known = {}
+        if state:
+            self.high_water, members = state
+            for id in members:
+                self.known[id] = members[id]
+
+    def state(self):
+        """
+        Returns the state of the sync, suitable for pickling.
+        """
+        return (self.high_water, self.known)
+
+    def sync(self, full=False):
+        """
+        Walk the collection back to the high-water mark, or
+        over every page if 'full' is True.
+
+        Returns a tuple of three lists: the atom:entry
+        elements of the members created and of the members
+        updated since the last sync, and the atom:ids of
+        the members deleted, which is only filled in by a
+        full sync. The elements come from the collection
+        feed, so they may be incomplete.
+        """
+        created = []
+        updated = []
+        seen = set()
+        high_water = self.high_water
+        mark = self.high_water and self.high_water[0]
+        for entry in self.collection.iter_entry():
+            id = entry.findtext(ATOM("id"))
+            when = edited(entry)
+            if not full and mark is not None and when is not None:
+                if when < mark or (when == mark and self.known.get(id) == when):
+                    break
+            seen.add(id)
+            if id not in self.known:
+                created.append(entry)
+            elif self.known[id] != when:
+                updated.append(entry)
+            self.known[id] = when
+            if when is not None and (high_water is None or (when, id) > high_water):
+                high_water = (when, id)
+        deleted = []
+        if full:
+            deleted = [id for id in self.known if id not in seen]
+            for id in deleted:
+                del self.known[id]
+        self.high_water = high_water
+        return (created, updated, deleted)
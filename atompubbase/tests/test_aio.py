@@ -0,0 +1,96 @@
+import unittest
+import threading
+from model import Context, ATOM, ATOM_ENTRY
+from aio import Service, Collection, Entry, Future, ThreadedTransport
+from mockhttp import MockHttp
+
+HTTP_SRC_DIR = "./tests/"
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.transport = ThreadedTransport(lambda: MockHttp(HTTP_SRC_DIR), max_workers=4)
+
+    def tearDown(self):
+        self.transport.close()
+
+    def test_future_then(self):
+        f = Future()
+        chained = f.then(lambda x: x + 1)
+        self.assertFalse(chained.done())
+        f.set_result(1)
+        self.assertEqual(2, chained.result())
+
+    def test_future_exception(self):
+        f = Future()
+        chained = f.then(lambda x: 1 / x).then(lambda x: x + 1)
+        f.set_result(0)
+        self.assertTrue(isinstance(chained.exception(), ZeroDivisionError))
+        self.assertRaises(ZeroDivisionError, chained.result)
+
+    def test_service_iter_info(self):
+        s = Service(Context(service = "http://example.org/service.atomsvc"), self.transport)
+        ws_title, coll_title, coll_uri = s.iter_info().result(5)[0]
+        self.assertEqual("http://example.org/entry/index.atom", coll_uri)
+        self.assertEqual("Main Site", ws_title)
+        self.assertEqual("http://example.org/entry/index.atom", s.iter().result(5)[0].collection)
+
+    def test_collection_pages(self):
+        collection = Collection(Context(collection = "http://example.org/entry/index.atom"), self.transport)
+        pages = [page.result(5) for page in collection.pages()]
+        self.assertEqual(2, len(pages))
+        self.assertEqual(4, sum([len(page.findall(ATOM_ENTRY)) for page in pages]))
+        self.assertFalse(collection.has_next())
+
+    def test_collection_pages_error(self):
+        collection = Collection(Context(collection = "http://example.org/broken/index.atom"), self.transport)
+        pages = list(collection.pages())
+        self.assertEqual(1, len(pages))
+        self.assertNotEqual(None, pages[0].exception(5))
+
+    def test_collection_pages_missing(self):
+        collection = Collection(Context(collection = "http://example.org/missing/index.atom"), self.transport)
+        pages = [page.result(5) for page in collection.pages()]
+        self.assertEqual(1, len(pages))
+        self.assertNotEqual(None, pages[0])
+
+    def test_collection_pages_readahead(self):
+        transport = self.transport
+        requested = []
+        class Recording(object):
+            def request(self, uri, *args, **kwargs):
+                requested.append(uri)
+                return transport.request(uri, *args, **kwargs)
+        collection = Collection(Context(collection = "http://example.org/deep/index.atom"), Recording())
+        pages = collection.pages(readahead=1)
+        first = pages.next().result(5)
+        self.assertEqual("http://example.org/deep/1", first.findtext("{%s}entry/{%s}id" % (ATOM, ATOM)))
+        self.assertEqual(first, collection._model._etree)
+        # Give the transport time to run ahead if it could.
+        threading.Event().wait(0.2)
+        self.assertEqual(2, len(requested))
+        rest = [page.result(5) for page in pages]
+        self.assertEqual(3, len(rest))
+        self.assertEqual(4, len(requested))
+        self.assertFalse(collection.has_next())
+
+    def test_entry_create(self):
+        collection = Collection(Context(collection = "http://example.org/entry/index.atom"), self.transport)
+        futures = [collection.entry_create({}, "<entry></entry>") for i in range(10)]
+        self.assertEqual(["http://example.org/entry/68"] * 10, [f.result(5).entry for f in futures])
+
+    def test_entry_media(self):
+        entry = Entry(Context(entry = "http://example.org/images/77"), self.transport)
+        self.assertTrue(entry.has_media().result(5))
+        headers, body = entry.get_media().result(5)
+        self.assertEqual(200, headers.status)
+        self.assertEqual(7483, len(body))
+
+    def test_entry_put(self):
+        entry = Entry(Context(entry = "http://example.org/entry/67"), self.transport)
+        headers, body = entry.put().result(5)
+        self.assertEqual(200, headers.status)
+        self.assertEqual(None, entry._model.representation)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,10 @@
 import unittest
-from model import Context, Service, Collection
+import httplib2
+from model import Context, Service, Collection, ParseException, ATOM, get_many, copy_http
 from mockhttp import MockHttp
 
 HTTP_SRC_DIR = "./tests/"
+ATOM_ID = "{%s}id" % ATOM
 
 class Test(unittest.TestCase):
     def test_iter(self):
@@ -17,6 +19,163 @@ class Test(unittest.TestCase):
         self.assertEqual(context.entry, "http://example.org/entry/67")
         self.assertEqual(context.collection, "http://example.org/entry/index.atom")
 
+    def test_iter_entry_streaming(self):
+        context = Context(http = MockHttp(HTTP_SRC_DIR), collection = "http://example.org/entry/index.atom")
+        expected = [entry.findtext(ATOM_ID) for entry in Collection(context).iter_entry()]
+        collection = Collection(context)
+        streamed = [entry.findtext(ATOM_ID) for entry in collection.iter_entry(streaming=True)]
+        self.assertEqual(4, len(streamed))
+        self.assertEqual(expected, streamed)
+        self.assertEqual(None, collection.representation)
+
+    def test_iter_entry_streaming_trailing_next(self):
+        context = Context(http = MockHttp(HTTP_SRC_DIR), collection = "http://example.org/trailing/index.atom")
+        collection = Collection(context)
+        streamed = [entry.findtext(ATOM_ID) for entry in collection.iter_entry(streaming=True)]
+        self.assertEqual(3, len(streamed))
+        self.assertEqual("http://bitworking.org/news/41/Test", streamed[-1])
+
+    def test_iter_entry_streaming_clears(self):
+        context = Context(http = MockHttp(HTTP_SRC_DIR), collection = "http://example.org/entry/index.atom")
+        entries = Collection(context).iter_entry(streaming=True)
+        first = entries.next()
+        self.assertNotEqual(None, first.findtext(ATOM_ID))
+        entries.next()
+        self.assertEqual(None, first.findtext(ATOM_ID))
+
+    def test_iter_entry_streaming_stream(self):
+        bodies = []
+        class StreamingHttp(MockHttp):
+            def request(self, uri, method="GET", body=None, headers=None, redirections=5, stream=False):
+                headers, body = MockHttp.request(self, uri, method, body, headers, redirections, stream=stream)
+                bodies.append(body)
+                return (headers, body)
+        collection = Collection(Context(http = StreamingHttp(HTTP_SRC_DIR), collection = "http://example.org/entry/index.atom"))
+        self.assertEqual(4, len(list(collection.iter_entry(streaming=True))))
+        self.assertEqual(2, len(bodies))
+        for body in bodies:
+            self.assertTrue(hasattr(body, "read"))
+            self.assertTrue(body.closed)
+
+    def test_get_while_streaming(self):
+        context = Context(http = MockHttp(HTTP_SRC_DIR), collection = "http://example.org/entry/index.atom")
+        collection = Collection(context)
+        entries = collection.iter_entry(streaming=True)
+        entries.next()
+        # A suspended streaming iteration does not stop
+        # the collection from being parsed.
+        collection.get()
+        self.assertNotEqual(None, collection.representation)
+        self.assertEqual(2, len(collection.etree().findall("{%s}entry" % ATOM)))
+
+    def test_iter_member(self):
+        http = MockHttp(HTTP_SRC_DIR)
+        collection = Collection(Context(http = http, collection = "http://example.org/entry/index.atom"))
+        members = list(collection.iter_member())
+        self.assertEqual([c.entry for c in collection.iter()], [member.uri() for member in members])
+        # The feed copy has no edit-media link, so it can't
+        # tell whether the entry has media.
+        self.assertFalse(members[0].has_media())
+        self.assertEqual(1, http.hit_counter["GEThttp://example.org/entry/67"])
+        members[0].put()
+        self.assertEqual(1, http.hit_counter["GEThttp://example.org/entry/67"])
+        self.assertEqual(1, http.hit_counter["PUThttp://example.org/entry/67"])
+
+        collection = Collection(Context(http = http, collection = "http://example.org/images/index.atom"))
+        member = collection.iter_member().next()
+        self.assertTrue(member.has_media())
+        headers, body = member.get_media()
+        self.assertEqual(200, headers.status)
+        self.assertFalse("GEThttp://example.org/images/77" in http.hit_counter)
+        # The feed copy is never PUT back, the entry is retrieved first.
+        member.put()
+        self.assertEqual(1, http.hit_counter["GEThttp://example.org/images/77"])
+        self.assertEqual(1, http.hit_counter["PUThttp://example.org/images/77"])
+
+    def test_iter_missing_page(self):
+        # The next page is a 404, which ends the collection.
+        context = Context(http = MockHttp(HTTP_SRC_DIR), collection = "http://example.org/missing/index.atom")
+        collection = Collection(context)
+        self.assertEqual(["http://example.org/missing/1"], [c.entry for c in collection.iter()])
+        self.assertFalse(collection.has_next())
+        self.assertEqual(["http://example.org/missing/1"], [c.entry for c in collection.iter(readahead=2)])
+
+    def test_iter_readahead(self):
+        context = Context(http = MockHttp(HTTP_SRC_DIR), collection = "http://example.org/entry/index.atom")
+        expected = [c.entry for c in Collection(context).iter()]
+        collection = Collection(context)
+        self.assertEqual(expected, [c.entry for c in collection.iter(readahead=2)])
+        self.assertFalse(collection.has_next())
+
+    def test_iter_entry_readahead(self):
+        context = Context(http = MockHttp(HTTP_SRC_DIR), collection = "http://example.org/entry/index.atom")
+        expected = [entry.findtext(ATOM_ID) for entry in Collection(context).iter_entry()]
+        streamed = [entry.findtext(ATOM_ID) for entry in Collection(context).iter_entry(readahead=1)]
+        self.assertEqual(expected, streamed)
+
+    def test_iter_readahead_error(self):
+        context = Context(http = MockHttp(HTTP_SRC_DIR), collection = "http://example.org/broken/index.atom")
+        collection = Collection(context)
+        self.assertRaises(ParseException, list, collection.iter(readahead=1))
+
+    def test_fetch_entries(self):
+        context = Context(http = MockHttp(HTTP_SRC_DIR), collection = "http://example.org/entry/index.atom")
+        collection = Collection(context)
+        results = list(collection.fetch_entries(max_workers=3, http_factory=lambda: MockHttp(HTTP_SRC_DIR)))
+        self.assertEqual(4, len(results))
+        self.assertEqual(["http://example.org/entry/67", "http://example.org/entry/66",
+            "http://example.org/entry/42/", "http://example.org/entry/41/"],
+            [entry.uri() for entry, error in results])
+        entry, error = results[0]
+        self.assertEqual(None, error)
+        self.assertEqual("http://bitworking.org/news/67/Atom-Powered-Robots-Run-Amok", entry.etree().findtext(ATOM_ID))
+        self.assertEqual(context.http, entry.context().http)
+        self.assertTrue(all([error is not None for entry, error in results[1:]]))
+
+    def test_get_many_unordered(self):
+        http = MockHttp(HTTP_SRC_DIR)
+        contexts = [Context(http = http, entry = "http://example.org/entry/67"),
+            Context(http = http, entry = "http://example.org/images/77")]
+        results = get_many(contexts, max_workers=2, ordered=False, http_factory=lambda: MockHttp(HTTP_SRC_DIR))
+        uris = sorted([entry.uri() for entry, error in results])
+        self.assertEqual(["http://example.org/entry/67", "http://example.org/images/77"], uris)
+
+    def test_get_many_copies_http(self):
+        used = []
+        class RecordingHttp(MockHttp):
+            def request(self, uri, *args, **kwargs):
+                used.append(self)
+                return MockHttp.request(self, uri, *args, **kwargs)
+        http = RecordingHttp(HTTP_SRC_DIR)
+        http.credentials = "joe:secret"
+        contexts = [Context(http = http, entry = "http://example.org/entry/67"),
+            Context(http = http, entry = "http://example.org/images/77")]
+        results = list(get_many(contexts, max_workers=2))
+        self.assertEqual([None, None], [error for entry, error in results])
+        self.assertEqual(2, len(used))
+        self.assertTrue(http not in used)
+        self.assertEqual(["joe:secret", "joe:secret"], [worker.credentials for worker in used])
+        self.assertEqual(1, http.hit_counter["GEThttp://example.org/entry/67"])
+
+    def test_copy_http(self):
+        http = httplib2.Http()
+        http.add_credentials("joe", "secret")
+        http.connections["http:example.org"] = object()
+        worker = copy_http(http)
+        self.assertTrue(worker is not http)
+        self.assertEqual({}, worker.connections)
+        self.assertEqual(1, len(http.connections))
+        self.assertTrue(worker.credentials is http.credentials)
+        self.assertTrue(worker.cache is http.cache)
+        pooled = httplib2.PooledHttp()
+        self.assertTrue(copy_http(pooled) is pooled)
+
+    def test_get_many_factory_error(self):
+        def http_factory():
+            raise ValueError("no http")
+        contexts = [Context(http = MockHttp(HTTP_SRC_DIR), entry = "http://example.org/entry/67")]
+        self.assertRaises(ValueError, list, get_many(contexts, max_workers=2, http_factory=http_factory))
+
     def test_iter_empty(self):
         context = Context(http = MockHttp(HTTP_SRC_DIR), collection = "http://example.org/empty/index.atom")
         collection = Collection(context)
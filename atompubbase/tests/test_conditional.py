@@ -0,0 +1,132 @@
+import unittest
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import model
+from model import Context, Collection, ATOM_ENTRY
+from mockhttp import MockHttp
+from conditional import MemoryStore, DbmStore, SqliteStore
+
+HTTP_SRC_DIR = "./tests/"
+URI = "http://example.org/cond/index.atom"
+
+class RecordingHttp(MockHttp):
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5):
+        self.last_headers = headers or {}
+        return MockHttp.request(self, uri, method, body, headers, redirections)
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _revalidate(self, store):
+        http = RecordingHttp(HTTP_SRC_DIR)
+        collection = Collection(Context(http = http, collection = URI, validators = store))
+        headers, body = collection.get()
+        self.assertEqual(200, headers.status)
+        self.assertFalse(headers.fromcache)
+        self.assertFalse('if-none-match' in http.last_headers)
+        etree = collection.etree()
+
+        headers, second_body = collection.get()
+        self.assertEqual('"v1"', http.last_headers['if-none-match'])
+        self.assertEqual("Tue, 08 May 2007 10:27:02 GMT", http.last_headers['if-modified-since'])
+        self.assertEqual(200, headers.status)
+        self.assertTrue(headers.fromcache)
+        self.assertEqual(body, second_body)
+        # Revalidated, so not parsed again.
+        self.assertTrue(etree is collection.etree())
+        self.assertEqual(1, store.trees.hits)
+        self.assertEqual(1, len(list(collection.iter_entry())))
+
+    def test_memory(self):
+        self._revalidate(MemoryStore())
+
+    def test_dbm(self):
+        store = DbmStore(os.path.join(self.dir, "validators"))
+        self._revalidate(store)
+        store.close()
+
+    def test_dbm_threads(self):
+        store = DbmStore(os.path.join(self.dir, "validators"))
+        errors = []
+        def work(n):
+            try:
+                for i in range(200):
+                    uri = "http://example.org/%d/%d" % (n, i % 10)
+                    store.set(uri, '"%d"' % i, None, "body %d" % i)
+                    self.assertNotEqual(None, store.get(uri))
+                    store.delete(uri)
+            except Exception, e:
+                errors.append(e)
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+        store.close()
+
+    def test_sqlite(self):
+        store = SqliteStore(os.path.join(self.dir, "validators.db"))
+        self._revalidate(store)
+        store.close()
+
+    def test_persistent(self):
+        filename = os.path.join(self.dir, "validators.db")
+        store = SqliteStore(filename)
+        Collection(Context(http = MockHttp(HTTP_SRC_DIR), collection = URI, validators = store)).get()
+        store.close()
+
+        http = MockHttp(HTTP_SRC_DIR)
+        http.hit_counter["GET" + URI] = 1
+        collection = Collection(Context(http = http, collection = URI, validators = SqliteStore(filename)))
+        headers, body = collection.get()
+        self.assertTrue(headers.fromcache)
+        self.assertEqual(1, len(collection.etree().findall(ATOM_ENTRY)))
+
+    def test_pickle(self):
+        filename = os.path.join(self.dir, "validators.db")
+        for store in [SqliteStore(filename), DbmStore(os.path.join(self.dir, "validators"))]:
+            store.set(URI, '"v1"', None, "body")
+            context = pickle.loads(pickle.dumps(Context(http = MockHttp(HTTP_SRC_DIR), collection = URI, validators = store)))
+            self.assertEqual(('"v1"', None, "body"), context.validators.get(URI))
+            context.validators.close()
+            store.close()
+        store = MemoryStore()
+        store.set(URI, '"v1"', None, "body")
+        context = pickle.loads(pickle.dumps(Context(http = MockHttp(HTTP_SRC_DIR), collection = URI, validators = store)))
+        self.assertEqual(('"v1"', None, "body"), context.validators.get(URI))
+
+    def test_errors_keep_validators(self):
+        store = MemoryStore()
+        context = Context(http = MockHttp(HTTP_SRC_DIR), validators = store)
+        error = "http://example.org/cond/error.atom"
+        store.set(error, '"v1"', None, "body")
+        headers, body = model.conditional_request(context, error)
+        self.assertEqual(503, headers.status)
+        self.assertEqual(('"v1"', None, "body"), store.get(error))
+
+        gone = "http://example.org/cond/gone.atom"
+        store.set(gone, '"v1"', None, "body")
+        headers, body = model.conditional_request(context, gone)
+        self.assertEqual(404, headers.status)
+        self.assertEqual(None, store.get(gone))
+
+    def test_no_store(self):
+        http = RecordingHttp(HTTP_SRC_DIR)
+        collection = Collection(Context(http = http, collection = URI))
+        collection.get()
+        headers, body = collection.get()
+        self.assertFalse('if-none-match' in http.last_headers)
+        self.assertEqual(304, headers.status)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -45,6 +45,47 @@ class Test(unittest.TestCase):
         self.assertEqual(c.collection, "http://example.org/collection/1/")
         self.assertEqual(c.entry, "http://example.org/collection/1/1")
 
+    def test_derive(self):
+        c = Context()
+        c.service = "http://example.org/service.atomsvc"
+        c.collection = "http://example.org/collection/1/"
+        c.collpush("http://fred.org/")
+
+        e = c.derive(entry="http://fred.org/1")
+        self.assertEqual(e.entry, "http://fred.org/1")
+        self.assertEqual(e.collection, "http://fred.org/")
+        self.assertEqual(e.service, "http://example.org/service.atomsvc")
+        self.assertTrue(e.http is c.http)
+        self.assertEqual(c.entry, None)
+        e.collpop()
+        self.assertEqual(e.collection, "http://example.org/collection/1/")
+        self.assertEqual(c.collection, "http://fred.org/")
+
+        d = c.derive(collection="http://example.org/collection/2/")
+        self.assertEqual(d.collection, "http://example.org/collection/2/")
+        self.assertEqual(d.entry, None)
+        self.assertRaises(IndexError, d.collpop)
+
+        bus = object()
+        c.bus = bus
+        self.assertTrue(c.derive().bus is bus)
+
+    def test_unpickle_unslotted(self):
+        # A Context pickled before Context had __slots__.
+        old = "ccopy_reg\n_reconstructor\np0\n(cmodel\nContext\np1\nc__builtin__\nobject\np2\nNtp3\nRp4\n(dp5\nS'_collection'\np6\nS'http://fred.org/'\np7\nsS'_service'\np8\nS'http://example.org/service.atomsvc'\np9\nsS'_collection_stack'\np10\n(lp11\n(S'http://example.org/collection/1/'\np12\nS'http://example.org/collection/1/1'\np13\ntp14\nasS'http'\np15\nNsS'_entry'\np16\nNsb."
+        c = pickle.loads(old)
+        self.assertEqual(c.service, "http://example.org/service.atomsvc")
+        self.assertEqual(c.collection, "http://fred.org/")
+        self.assertEqual(c.entry, None)
+        self.assertEqual(c.validators, None)
+        c.collpop()
+        self.assertEqual(c.collection, "http://example.org/collection/1/")
+        self.assertEqual(c.entry, "http://example.org/collection/1/1")
+
+    def test_slots(self):
+        c = Context()
+        self.assertRaises(AttributeError, setattr, c, "colection", "http://example.org/")
+
     def test_restore(self):
         class A(object):
             def __init__(self, context):
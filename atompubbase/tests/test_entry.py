@@ -1,5 +1,5 @@
 import unittest
-from model import Context, Service, Collection, Entry
+from model import Context, Service, Collection, Entry, ParseException, batch, update_many, UPDATED, CONFLICT, FAILED
 from mockhttp import MockHttp
 
 HTTP_SRC_DIR = "./tests/"
@@ -21,6 +21,18 @@ class Test(unittest.TestCase):
         self.assertFalse(entry.has_media())
         self.assertEqual(0, len(body))
 
+    def test_put_unconditional(self):
+        class RecordingHttp(MockHttp):
+            def request(self, uri, method="GET", body=None, headers=None, redirections=5):
+                self.last_headers = headers or {}
+                return MockHttp.request(self, uri, method, body, headers, redirections)
+        http = RecordingHttp(HTTP_SRC_DIR)
+        entry = Entry(Context(http = http, entry = "http://example.org/entry/stale"))
+        entry.get()
+        self.assertEqual('"v1"', entry.etag)
+        entry.put()
+        self.assertFalse('if-match' in http.last_headers)
+
     def test_delete(self):
         context = Context(http = MockHttp(HTTP_SRC_DIR), entry = "http://example.org/entry/67")
         entry = Entry(context)
@@ -40,6 +52,13 @@ class Test(unittest.TestCase):
         self.assertTrue(headers['content-type'], 'image/jpg')
         self.assertEqual(7483, len(body))
 
+    def test_get_media_stream(self):
+        context = Context(http = MockHttp(HTTP_SRC_DIR), entry = "http://example.org/images/77")
+        entry = Entry(context)
+        (headers, body) = entry.get_media(stream=True)
+        self.assertEqual(200, headers.status)
+        self.assertEqual(7483, len(body.read()))
+
     def test_put_media(self):
         context = Context(http = MockHttp(HTTP_SRC_DIR), entry = "http://example.org/images/77")
         entry = Entry(context)
@@ -50,6 +69,49 @@ class Test(unittest.TestCase):
         self.assertEqual(202, headers.status) # We don't really expect 202 from a PUT, just testing.
 
 
+    def test_batch(self):
+        http = MockHttp(HTTP_SRC_DIR)
+        entries = [Entry(Context(http = http, entry = "http://example.org/entry/%d" % n)) for n in [67, 68, 67]] 
+        operations = [(entries[0], "delete"), (entries[1], "delete"), (entries[2], "put", None, "<entry></entry>")]
+        workers = []
+        def http_factory():
+            workers.append(MockHttp(HTTP_SRC_DIR))
+            return workers[-1]
+        results = list(batch(operations, max_workers=2, http_factory=http_factory))
+        self.assertEqual(operations, [operation for operation, response, error in results])
+        self.assertEqual([200, 404, 200], [response[0].status for operation, response, error in results])
+        self.assertEqual([None] * 3, [error for operation, response, error in results])
+        self.assertEqual(2, len(workers))
+        self.assertEqual({}, http.hit_counter)
+        self.assertTrue(entries[0]._context.http is http)
+
+        results = list(batch([(entries[1], "no_such_method")], http_factory=None))
+        self.assertEqual(AttributeError, results[0][2].__class__)
+
+    def test_update_many(self):
+        class RecordingHttp(MockHttp):
+            def request(self, uri, method="GET", body=None, headers=None, redirections=5):
+                if method == "PUT":
+                    self.sent.append((uri, (headers or {}).get("if-match"), body))
+                return MockHttp.request(self, uri, method, body, headers, redirections)
+        http = RecordingHttp(HTTP_SRC_DIR)
+        http.sent = []
+        def retitle(etree):
+            etree.find("{http://www.w3.org/2005/Atom}title").text = "Changed"
+        updates = [(Context(http = http, entry = "http://example.org/entry/%s" % name), retitle)
+                   for name in ["conflict", "stale", "missing", "weak"]]
+        results = list(update_many(updates, http_factory=None, retries=2))
+        self.assertEqual([context for context, mutate in updates], [result.context for result in results])
+        self.assertEqual([UPDATED, CONFLICT, FAILED, UPDATED], [result.outcome for result in results])
+        self.assertEqual([2, 3, 0, 1], [result.attempts for result in results])
+        self.assertTrue(isinstance(results[2].error, ParseException))
+        self.assertEqual(404, results[2].headers.status)
+        self.assertEqual([None], [etag for uri, etag, body in http.sent if uri.endswith("weak")])
+
+        conflict = [(etag, body) for uri, etag, body in http.sent if uri.endswith("conflict")]
+        self.assertEqual(['"v1"', '"v2"'], [etag for etag, body in conflict])
+        self.assertTrue("title>Changed</" in conflict[1][1])
+        self.assertEqual(3, http.hit_counter["GEThttp://example.org/entry/stale"])
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,5 +1,7 @@
-from events import add_event_handlers, register_callback, clear
+from events import add_event_handlers, register_callback, clear, Events, Dispatcher, events
+import threading
 import unittest
+import httplib2
 
 class Entry(object):
     def get(self, headers, body = None):
@@ -14,8 +16,22 @@ class Service(object):
         return ({'status': '200'}, "baz") 
 
 
+class Context(object):
+    def __init__(self, bus=None):
+        self.bus = bus
+
+
+class ContextEntry(object):
+    def __init__(self, context):
+        self._context = context
+
+    def get(self, headers, body = None):
+        return ({}, "foo") 
+
+
 add_event_handlers(Entry)
 add_event_handlers(Service)
+add_event_handlers(ContextEntry)
 
 class Test(unittest.TestCase):
     def setUp(self):
@@ -132,6 +148,126 @@ class Test(unittest.TestCase):
         Service().get({}, "")
         self.assertEqual(self.count, 2)
 
+    def test_clear_after_trigger(self):
+        """Make sure the dispatch table is rebuilt when callbacks change."""
+        register_callback("PRE_GET", self.inc_cb)
+        Entry().get({}, "")
+        clear()
+        Entry().get({}, "")
+        self.assertEqual(self.count, 1)
+        register_callback("POST_ENTRY", self.inc_cb)
+        Entry().get({}, "")
+        self.assertEqual(self.count, 2)
+
+    def test_register_while_compiling(self):
+        """A dispatch table compiled before a register() is not kept."""
+        class RacingEvents(Events):
+            racer = None
+            def _compile(self, when, classname, methodname):
+                compiled = Events._compile(self, when, classname, methodname)
+                if self.racer is None:
+                    self.racer = threading.Thread(target=self.register, args=("PRE_GET", test.inc_cb))
+                    self.racer.start()
+                    self.racer.join(0.2)
+                return compiled
+        test = self
+        bus = RacingEvents()
+        ContextEntry(Context(bus)).get({}, "")
+        bus.racer.join()
+        self.assertEqual(self.count, 0)
+        ContextEntry(Context(bus)).get({}, "")
+        self.assertEqual(self.count, 1)
+
+    def test_context_bus(self):
+        """Events go to the bus of the Context and not the global bus."""
+        bus = Events()
+        bus.register("PRE_GET", self.inc_cb)
+        register_callback("POST_GET", self.post_cb)
+        ContextEntry(Context(bus)).get({}, "")
+        self.assertEqual(self.count, 1)
+        self.assertFalse(self.post_called)
+        Entry().get({}, "")
+        self.assertEqual(self.count, 1)
+        self.assertTrue(self.post_called)
+
+    def test_context_bus_fallback(self):
+        """A Context without a bus uses the global bus."""
+        register_callback("PRE_GET", self.inc_cb)
+        ContextEntry(Context()).get({}, "")
+        self.assertEqual(self.count, 1)
+
+    def test_context_bus_parent(self):
+        """Callbacks on the parent bus are called after those on the child."""
+        order = []
+        bus = Events(parent=events)
+        bus.register("PRE_GET", lambda h, b, f: order.append("context"))
+        register_callback("PRE_GET", lambda h, b, f: order.append("global"))
+        ContextEntry(Context(bus)).get({}, "")
+        self.assertEqual(order, ["context", "global"])
+
+    def test_dispatcher(self):
+        """Callbacks given a Dispatcher are called off the calling thread."""
+        threads = []
+        dispatcher = Dispatcher()
+        register_callback("POST_GET", lambda h, b, f: threads.append(threading.currentThread()), dispatcher)
+        register_callback("PRE_GET", self.pre_cb, dispatcher)
+        Entry().get({"foo": "bar"}, "")
+        dispatcher.close()
+        self.assertEqual(len(threads), 1)
+        self.assertFalse(threads[0] is threading.currentThread())
+        self.assertEqual(self.pre_headers, {"foo": "bar"})
+        self.assertTrue("GET" in self.pre_attribs)
+
+    def test_dispatcher_response(self):
+        """Deferred callbacks get a copy of the response, attributes and all."""
+        dispatcher = Dispatcher()
+        bus = Events()
+        bus.register("POST", self.post_cb, dispatcher)
+        response = httplib2.Response({"status": "304", "etag": '"1"'})
+        response.fromcache = True
+        bus.trigger("POST", "get", Entry(), response, "")
+        dispatcher.close()
+        self.assertFalse(self.post_headers is response)
+        self.assertEqual(304, self.post_headers.status)
+        self.assertTrue(self.post_headers.fromcache)
+        self.assertEqual('"1"', self.post_headers["etag"])
+
+    def test_dispatcher_overflow(self):
+        """Calls are dropped or sampled once the queue is full."""
+        # Without workers nothing is taken off the queue.
+        dispatcher = Dispatcher(workers=0, max_queue=1, overflow="drop")
+        self.assertTrue(dispatcher.submit(self.inc_cb, {}, "", set()))
+        for i in range(5):
+            self.assertFalse(dispatcher.submit(self.inc_cb, {}, "", set()))
+        self.assertEqual(dispatcher.dropped, 5)
+
+        # The one worker is held in the first call, and the
+        # second fills the queue.
+        started = threading.Event()
+        gate = threading.Event()
+        def hold(headers, body, attribs):
+            started.set()
+            gate.wait()
+            self.inc_cb(headers, body, attribs)
+        dispatcher = Dispatcher(workers=1, max_queue=1, overflow="sample", sample=3)
+        dispatcher.submit(hold, {}, "", set())
+        started.wait()
+        dispatcher.submit(self.inc_cb, {}, "", set())
+        self.assertFalse(dispatcher.submit(self.inc_cb, {}, "", set()))
+        self.assertFalse(dispatcher.submit(self.inc_cb, {}, "", set()))
+        # The third call over the limit waits for room.
+        sampled = threading.Thread(target=dispatcher.submit, args=(self.inc_cb, {}, "", set()))
+        sampled.start()
+        sampled.join(0.1)
+        self.assertTrue(sampled.isAlive())
+        gate.set()
+        sampled.join()
+        dispatcher.close()
+        self.assertEqual(dispatcher.dropped, 2)
+        self.assertEqual(self.count, 3)
+
+        self.assertRaises(ValueError, Dispatcher, overflow="fifo")
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,69 @@
+import unittest
+import model
+import metrics
+from model import Context, Collection, Entry
+from mockhttp import MockHttp
+from treecache import TreeCache
+
+HTTP_SRC_DIR = "./tests/"
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.saved = model.tree_cache
+        model.tree_cache = TreeCache()
+        metrics.sink = metrics.MemorySink()
+        model.init_event_handlers()
+
+    def tearDown(self):
+        model.tree_cache = self.saved
+        metrics.sink = None
+
+    def test_collection_pages(self):
+        c = Collection(Context(http = MockHttp(HTTP_SRC_DIR), collection = "http://example.org/entry/index.atom"))
+        entries = len(list(c.iter()))
+        first = metrics.sink.histogram("atompub_entries_per_page", "Collection", "get")
+        rest = metrics.sink.histogram("atompub_entries_per_page", "Collection", "get_next")
+        self.assertEqual(1, first.count)
+        self.assertEqual(1, rest.count)
+        self.assertEqual(entries, first.sum + rest.sum)
+        self.assertEqual(1, metrics.sink.histogram("atompub_parse_seconds", "Collection", "get_next").count)
+        self.assertEqual(1, metrics.sink.histogram("atompub_request_seconds", "Collection", "get_next").count)
+        self.assertEqual(None, metrics.current())
+
+    def test_entry_get(self):
+        http = MockHttp(HTTP_SRC_DIR)
+        records = []
+        class Sink(object):
+            def emit(self, record):
+                records.append(record)
+        metrics.sink = Sink()
+        for i in range(2):
+            Entry(Context(http = http, entry = "http://example.org/images/77")).get()
+        self.assertEqual(["miss", "hit"], [r.tree_cache for r in records])
+        self.assertEqual("Entry", records[0].classname)
+        self.assertEqual("get", records[0].method)
+        self.assertEqual("http://example.org/images/77", records[0].uri)
+        self.assertEqual(200, records[0].status)
+        self.assertEqual("miss", records[0].cache)
+        self.assertTrue(records[0].bytes_received > 0)
+        self.assertTrue(records[0].parse_seconds > 0)
+        self.assertEqual(0.0, records[1].parse_seconds)
+        self.assertTrue(records[0].end >= records[0].start)
+
+    def test_no_sink(self):
+        metrics.sink = None
+        Entry(Context(http = MockHttp(HTTP_SRC_DIR), entry = "http://example.org/images/77")).get()
+        self.assertEqual(None, metrics.current())
+
+    def test_prometheus(self):
+        Entry(Context(http = MockHttp(HTTP_SRC_DIR), entry = "http://example.org/images/77")).get()
+        text = metrics.sink.prometheus()
+        self.assertTrue("# TYPE atompub_request_seconds histogram\n" in text)
+        self.assertTrue('atompub_request_seconds_bucket{class="Entry",method="get",le="+Inf"} 1\n' in text)
+        self.assertTrue('atompub_request_seconds_count{class="Entry",method="get"} 1\n' in text)
+        self.assertTrue('atompub_requests_total{class="Entry",method="get",cache="miss"} 1\n' in text)
+        self.assertTrue("# TYPE atompub_bytes_received_total counter\n" in text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import os
+import shutil
+import tempfile
+from model import Context, Collection
+from mockhttp import MockHttp
+from mirror import CollectionMirror
+
+HTTP_SRC_DIR = "./tests/"
+URI = "http://example.org/sync/index.atom"
+PAGE_2 = "http://example.org/sync/index.page.2.atom"
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, "mirror.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_refresh(self):
+        http = MockHttp(HTTP_SRC_DIR)
+        mirror = CollectionMirror(Context(http = http, collection = URI), self.filename)
+        mirror.refresh()
+        self.assertEqual(3, len(mirror))
+        member = mirror.by_id("http://example.org/sync/b")
+        self.assertEqual("http://example.org/sync/b", member.edit)
+        self.assertEqual(None, member.etag)
+        self.assertTrue("Entry b" in member.xml)
+        self.assertEqual("http://example.org/sync/b", mirror.by_edit("http://example.org/sync/b").id)
+        self.assertEqual(None, mirror.by_id("http://example.org/sync/d"))
+        mirror.close()
+
+        # Re-open the mirror, only the first page is fetched again.
+        mirror = CollectionMirror(Collection(Context(http = http, collection = URI)), self.filename)
+        created, updated, deleted = mirror.refresh()
+        self.assertEqual(1, len(created))
+        self.assertEqual(1, len(updated))
+        self.assertEqual(1, http.hit_counter["GET" + PAGE_2])
+        self.assertEqual(4, len(mirror))
+        self.assertNotEqual(None, mirror.by_edit("http://example.org/sync/d"))
+
+        mirror.refresh(full=True)
+        self.assertEqual(3, len(mirror))
+        self.assertEqual(None, mirror.by_id("http://example.org/sync/a"))
+        mirror.close()
+
+    def test_refresh_error(self):
+        class Broken(Exception):
+            pass
+        def store(entry, xml, etag=None):
+            raise Broken()
+        http = MockHttp(HTTP_SRC_DIR)
+        mirror = CollectionMirror(Context(http = http, collection = URI), self.filename)
+        mirror._store = store
+        self.assertRaises(Broken, mirror.refresh)
+        self.assertEqual(0, len(mirror))
+        self.assertEqual(None, mirror._sync.high_water)
+
+        # Nothing was kept, so the next refresh stores every
+        # member, including the one added since.
+        del mirror._store
+        created, updated, deleted = mirror.refresh()
+        self.assertEqual(4, len(created))
+        self.assertEqual(4, len(mirror))
+        self.assertTrue("Entry b" in mirror.by_id("http://example.org/sync/b").xml)
+        mirror.close()
+
+    def test_fetch(self):
+        mirror = CollectionMirror(Context(http = MockHttp(HTTP_SRC_DIR), collection = "http://example.org/images/index.atom"), self.filename)
+        mirror.refresh(fetch=True, http_factory=lambda: MockHttp(HTTP_SRC_DIR))
+        member = mirror.by_edit("http://example.org/images/77")
+        self.assertEqual('"77"', member.etag)
+        self.assertEqual("http://example.org/media/waves.jpg", member.edit_media)
+        self.assertTrue(member.xml.startswith("<entry"))
+        mirror.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
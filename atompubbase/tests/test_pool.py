@@ -0,0 +1,35 @@
+import unittest
+import httplib2
+import testserver
+import model
+from model import Context, Entry, get_many
+
+ENTRY = """<entry xmlns="http://www.w3.org/2005/Atom">
+  <title>Entry</title>
+  <id>http://example.org/entry/1</id>
+  <updated>2008-01-01T00:00:00Z</updated>
+  <link href="%s" rel="edit" />
+</entry>"""
+
+
+class Handler(testserver.Handler):
+    def do_GET(self):
+        self.send_body(ENTRY % self.path, headers={"Content-Type": "application/atom+xml"})
+
+
+class Test(testserver.ServerTestCase):
+    handler = Handler
+
+    def test_shared_between_threads(self):
+        http = httplib2.PooledHttp(max_per_host=2)
+        contexts = [Context(http, entry=self.base + "/entry/%d" % i) for i in range(20)]
+        results = list(get_many(contexts, max_workers=5, http_factory=None))
+        self.assertEqual([None] * 20, [error for entry, error in results])
+        self.assertEqual(["/entry/%d" % i for i in range(20)], [model.link_value(entry.etree(), ".", "edit") for entry, error in results])
+        stats = http.stats()
+        self.assertTrue(stats["created"] <= 2)
+        self.assertEqual(20, stats["created"] + stats["reused"])
+
+
+if __name__ == "__main__":
+    unittest.main()
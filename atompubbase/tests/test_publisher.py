@@ -0,0 +1,100 @@
+import errno
+import itertools
+import unittest
+import threading
+import httplib2
+import testserver
+from model import Context, Collection
+from publisher import Publisher, PublishError
+
+ENTRY = """<entry xmlns="http://www.w3.org/2005/Atom"><title>%d</title></entry>"""
+
+
+class Handler(testserver.Handler):
+    lock = threading.Lock()
+    # Maps the body of each entry to the number of POSTs of it.
+    posts = {}
+    # Bodies that get a 503 on their first POST.
+    busy = set()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["content-length"]))
+        self.lock.acquire()
+        try:
+            count = self.posts[body] = self.posts.get(body, 0) + 1
+        finally:
+            self.lock.release()
+        if "<title>bad" in body:
+            self.send_body("", 400)
+        elif body in self.busy and count == 1:
+            self.send_body("", 503, {"Retry-After": "0"})
+        else:
+            self.send_body("", 201, {"Location": "http://example.org/entry/%d" % hash(body)})
+
+
+class Test(testserver.ServerTestCase):
+    handler = Handler
+
+    def setUp(self):
+        Handler.posts = {}
+        Handler.busy = set()
+        testserver.ServerTestCase.setUp(self)
+        self.uri = self.base + "/collection"
+
+    def test_publish(self):
+        bodies = [ENTRY % i for i in range(20)]
+        Handler.busy = set(bodies[::3])
+        publisher = Publisher(Collection(Context(httplib2.Http(), collection=self.uri)), max_workers=4, backoff=0.01)
+        results = list(publisher.publish(bodies + ["<entry><title>bad</title></entry>"]))
+        self.assertEqual(21, len(results))
+        created = [(item, context) for item, context, error in results if error is None]
+        self.assertEqual(sorted(bodies), sorted([item for item, context in created]))
+        for item, context in created:
+            self.assertEqual("http://example.org/entry/%d" % hash(item), context.entry)
+            self.assertEqual(self.uri, context.collection)
+        errors = [error for item, context, error in results if error is not None]
+        self.assertEqual(1, len(errors))
+        self.assertTrue(isinstance(errors[0], PublishError))
+        self.assertEqual(400, errors[0].headers.status)
+        for body in bodies:
+            self.assertEqual(body in Handler.busy and 2 or 1, Handler.posts[body])
+
+    def test_ordered(self):
+        bodies = [ENTRY % i for i in range(10)]
+        Handler.busy = set(bodies[:1])
+        publisher = Publisher(Context(httplib2.Http(), collection=self.uri), ordered=True, backoff=0.01)
+        self.assertEqual(bodies, [item for item, context, error in publisher.publish(bodies)])
+
+    def test_bounded(self):
+        taken = []
+        def items():
+            for i in itertools.count():
+                taken.append(i)
+                yield ENTRY % i
+        publisher = Publisher(Context(httplib2.Http(), collection=self.uri), max_workers=2)
+        results = publisher.publish(items())
+        for i in range(5):
+            results.next()
+        # Give the workers time to run ahead if they could.
+        threading.Event().wait(0.2)
+        self.assertTrue(len(taken) <= 5 + 4)
+        results.close()
+
+    def test_refused(self):
+        class Counting(Publisher):
+            delays = []
+            def _delay(self, attempt, retry_after):
+                self.delays.append(attempt)
+                return Publisher._delay(self, attempt, retry_after)
+        # Nothing listens on port 1.
+        publisher = Counting(Context(httplib2.Http(), collection="http://127.0.0.1:1/collection"), retries=2, backoff=0.01)
+        results = list(publisher.publish([ENTRY % 1]))
+        self.assertEqual(1, len(results))
+        self.assertEqual(None, results[0][1])
+        self.assertEqual(errno.ECONNREFUSED, results[0][2].errno)
+        # Tried once and retried twice.
+        self.assertEqual([0, 1], publisher.delays)
+
+
+if __name__ == "__main__":
+    unittest.main()
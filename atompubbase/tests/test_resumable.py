@@ -0,0 +1,199 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+import httplib2
+import testserver
+import events
+from model import Context, Collection
+from resumable import MemoryJournal, DbmJournal, journal_key
+
+MEDIA = "".join([chr(i % 251) for i in range(100000)])
+CHUNK = 16384
+
+
+class Handler(testserver.Handler):
+    """
+    A stand-in for a server that supports resumable uploads.
+    """
+    # Maps session path to the bytes received.
+    sessions = {}
+    created = []
+    # The number of bytes received in all.
+    received = [0]
+    # Once this many ranges have been received, drop the
+    # connection after taking half of each of the next
+    # 'drops' ranges.
+    drop_after = [None]
+    drops = [0]
+    # The number of PUTs received.
+    puts = [0]
+    # Answer every PUT with 404, or with a 308 that
+    # acknowledges nothing.
+    expire = [False]
+    stall = [False]
+
+    def respond(self, status, headers={}):
+        self.send_body("", status, headers)
+
+    def do_POST(self):
+        session = "/upload/%d" % len(self.sessions)
+        self.sessions[session] = ""
+        self.respond(200, {"Location": "http://%s:%d%s" % (self.server.server_address + (session,))})
+
+    def do_PUT(self):
+        length = int(self.headers["content-length"])
+        data = self.rfile.read(length)
+        self.puts[0] += 1
+        if self.stall[0]:
+            self.respond(308)
+            return
+        if self.path not in self.sessions or self.expire[0]:
+            self.respond(404)
+            return
+        range, total = self.headers["content-range"].split(" ")[1].split("/")
+        if range != "*":
+            start = int(range.split("-")[0])
+            if self.drop_after[0] is not None:
+                if self.drop_after[0] == 0:
+                    self.drops[0] -= 1
+                    if not self.drops[0]:
+                        self.drop_after[0] = None
+                    data = data[:len(data) / 2]
+                    self.sessions[self.path] = self.sessions[self.path][:start] + data
+                    self.received[0] += len(data)
+                    self.close_connection = 1
+                    return
+                self.drop_after[0] -= 1
+            self.sessions[self.path] = self.sessions[self.path][:start] + data
+            self.received[0] += len(data)
+        have = len(self.sessions[self.path])
+        if have == int(total):
+            self.created.append(self.sessions[self.path])
+            self.respond(201, {"Location": "http://example.org/media/1"})
+        elif have:
+            self.respond(308, {"Range": "bytes=0-%d" % (have - 1)})
+        else:
+            self.respond(308)
+
+
+
+class Test(testserver.ServerTestCase):
+    handler = Handler
+
+    def setUp(self):
+        Handler.sessions = {}
+        Handler.created = []
+        Handler.received = [0]
+        Handler.drop_after = [None]
+        Handler.drops = [0]
+        Handler.puts = [0]
+        Handler.expire = [False]
+        Handler.stall = [False]
+        testserver.ServerTestCase.setUp(self)
+        self.uri = self.base + "/collection"
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "media.bin")
+        f = open(self.path, "wb")
+        f.write(MEDIA)
+        f.close()
+
+    def tearDown(self):
+        testserver.ServerTestCase.tearDown(self)
+        shutil.rmtree(self.dir)
+
+    def test_upload(self):
+        collection = Collection(Context(httplib2.Http(), collection=self.uri, journal=MemoryJournal()))
+        headers, body = collection.create_resumable({"content-type": "application/octet-stream"}, MEDIA, chunk_size=CHUNK)
+        self.assertEqual(201, headers.status)
+        self.assertEqual([MEDIA], Handler.created)
+        self.assertEqual(len(MEDIA), Handler.received[0])
+
+    def test_retry_in_call(self):
+        # httplib2 sends the range a second time itself, so
+        # drop that too.
+        Handler.drop_after[0] = 2
+        Handler.drops[0] = 2
+        collection = Collection(Context(httplib2.Http(), collection=self.uri))
+        headers, body = collection.create_resumable(body=MEDIA, chunk_size=CHUNK, backoff=0)
+        self.assertEqual(201, headers.status)
+        self.assertEqual([MEDIA], Handler.created)
+        # The upload carries on from the middle of the range.
+        self.assertEqual(len(MEDIA) + CHUNK / 2, Handler.received[0])
+        self.assertEqual(1, len(Handler.sessions))
+
+    def test_retries_exhausted(self):
+        Handler.drop_after[0] = 0
+        Handler.drops[0] = 2
+        collection = Collection(Context(httplib2.Http(), collection=self.uri))
+        self.assertRaises(Exception, collection.create_resumable, body=MEDIA, chunk_size=CHUNK, retries=0)
+
+    def test_resume_from_journal(self):
+        class Crash(Exception):
+            pass
+        def crash(headers, body, filters):
+            if body[0] >= 3 * CHUNK:
+                raise Crash()
+        bus = events.Events()
+        bus.register("PROGRESS", crash)
+        journal = DbmJournal(os.path.join(self.dir, "journal"))
+        collection = Collection(Context(httplib2.Http(), collection=self.uri, journal=journal, bus=bus))
+        self.assertRaises(Crash, collection.create_resumable, path=self.path, chunk_size=CHUNK)
+        session, offset, length = journal.get(journal_key(self.uri, self.path))
+        self.assertEqual(3 * CHUNK, offset)
+        self.assertEqual(len(MEDIA), length)
+        self.assertEqual([], Handler.created)
+
+        # A new process, with a new Http, picks up where it left off.
+        collection = Collection(Context(httplib2.Http(), collection=self.uri, journal=journal))
+        headers, body = collection.create_resumable(path=self.path, chunk_size=CHUNK)
+        self.assertEqual(201, headers.status)
+        self.assertEqual([MEDIA], Handler.created)
+        self.assertEqual(1, len(Handler.sessions))
+        self.assertEqual(len(MEDIA), Handler.received[0])
+        self.assertEqual(None, journal.get(journal_key(self.uri, self.path)))
+        journal.close()
+
+    def test_expired_session(self):
+        journal = MemoryJournal()
+        journal.set(journal_key(self.uri, self.path), self.uri + "/gone", 5, len(MEDIA))
+        collection = Collection(Context(httplib2.Http(), collection=self.uri, journal=journal))
+        headers, body = collection.create_resumable(path=self.path, chunk_size=CHUNK, backoff=0)
+        self.assertEqual(201, headers.status)
+        self.assertEqual([MEDIA], Handler.created)
+
+    def test_expired_every_time(self):
+        Handler.expire[0] = True
+        collection = Collection(Context(httplib2.Http(), collection=self.uri))
+        headers, body = collection.create_resumable(body=MEDIA, chunk_size=CHUNK, retries=2, backoff=0)
+        self.assertEqual(404, headers.status)
+        # Started over twice.
+        self.assertEqual(3, len(Handler.sessions))
+        self.assertEqual(3, Handler.puts[0])
+
+    def test_no_progress(self):
+        Handler.stall[0] = True
+        collection = Collection(Context(httplib2.Http(), collection=self.uri))
+        headers, body = collection.create_resumable(body=MEDIA, chunk_size=CHUNK, retries=2, backoff=0)
+        self.assertEqual(308, headers.status)
+        self.assertEqual(3, Handler.puts[0])
+        self.assertEqual(0, Handler.received[0])
+
+    def test_empty(self):
+        collection = Collection(Context(httplib2.Http(), collection=self.uri))
+        headers, body = collection.create_resumable(body="", chunk_size=CHUNK)
+        self.assertEqual(201, headers.status)
+        self.assertEqual([""], Handler.created)
+
+    def test_pickle_journal(self):
+        journal = DbmJournal(os.path.join(self.dir, "journal"))
+        journal.set("key", self.uri + "/upload/0", 5, len(MEDIA))
+        context = pickle.loads(pickle.dumps(Context(httplib2.Http(), collection=self.uri, journal=journal)))
+        journal.close()
+        self.assertEqual((self.uri + "/upload/0", 5, len(MEDIA)), context.journal.get("key"))
+        context.journal.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
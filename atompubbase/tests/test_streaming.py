@@ -0,0 +1,111 @@
+import gzip
+import mmap
+import os
+import tempfile
+import unittest
+from StringIO import StringIO
+import httplib2
+import testserver
+import model
+import events
+from model import Context, Entry
+
+MEDIA = "".join([chr(i % 256) for i in range(300000)])
+
+
+class Handler(testserver.Handler):
+    received = []
+
+    def do_GET(self):
+        if self.path == "/gzip":
+            compressed = StringIO()
+            f = gzip.GzipFile(fileobj=compressed, mode="wb")
+            f.write(MEDIA)
+            f.close()
+            self.send_body(compressed.getvalue(), headers={"Content-Encoding": "gzip"})
+        else:
+            self.send_body(MEDIA)
+
+    def do_PUT(self):
+        if self.headers.get("transfer-encoding") == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+                if not size:
+                    break
+            self.received.append("".join(chunks))
+        else:
+            self.received.append(self.rfile.read(int(self.headers["content-length"])))
+        self.send_body("")
+
+
+class Test(testserver.ServerTestCase):
+    handler = Handler
+
+    def setUp(self):
+        Handler.received = []
+        testserver.ServerTestCase.setUp(self)
+
+    def test_put_media_progress(self):
+        fd, name = tempfile.mkstemp()
+        os.write(fd, MEDIA)
+        os.close(fd)
+        progress = []
+        everything = []
+        def cb(headers, body, filters):
+            progress.append(body)
+        def any(headers, body, filters):
+            everything.append(filters)
+        model.init_event_handlers()
+        bus = events.Events()
+        bus.register("PROGRESS_PUT_MEDIA", cb)
+        bus.register("ANY", any)
+        entry = Entry(Context(httplib2.Http(), entry=self.base + "/entry", bus=bus))
+        entry.representation = "<entry/>"
+        entry.edit_media = self.base + "/media"
+        try:
+            response, content = entry.put_media(path=name)
+            self.assertEqual(200, response.status)
+            self.assertEqual((len(MEDIA), len(MEDIA)), progress[-1])
+            self.assertTrue(len(progress) > 1)
+            self.assertEqual(2, len(everything))
+
+            del progress[:]
+            f = open(name, "rb")
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            entry.representation = "<entry/>"
+            entry.edit_media = self.base + "/media"
+            response, content = entry.put_media(body=m)
+            m.close()
+            f.close()
+            self.assertEqual((len(MEDIA), len(MEDIA)), progress[-1])
+            self.assertEqual([MEDIA, MEDIA], Handler.received)
+        finally:
+            os.remove(name)
+
+    def test_put_media_without_progress(self):
+        class Http(httplib2.Http):
+            # Knows nothing of progress.
+            def request(self, uri, method="GET", body=None, headers=None):
+                return httplib2.Http.request(self, uri, method, body, headers)
+        model.init_event_handlers()
+        entry = Entry(Context(Http(), entry=self.base + "/entry", bus=events.Events()))
+        entry.representation = "<entry/>"
+        entry.edit_media = self.base + "/media"
+        response, content = entry.put_media(body=StringIO(MEDIA))
+        self.assertEqual(200, response.status)
+        self.assertEqual([MEDIA], Handler.received)
+
+    def test_get_media(self):
+        entry = Entry(Context(httplib2.Http(), entry=self.base + "/entry"))
+        entry.representation = "<entry/>"
+        entry.edit_media = self.base + "/gzip"
+        model.init_event_handlers()
+        response, body = entry.get_media(stream=True)
+        self.assertEqual(MEDIA, body.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
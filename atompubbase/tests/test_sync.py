@@ -0,0 +1,59 @@
+import unittest
+import pickle
+from model import Context, Collection, ATOM
+from mockhttp import MockHttp
+from sync import CollectionSync
+
+HTTP_SRC_DIR = "./tests/"
+URI = "http://example.org/sync/index.atom"
+PAGE_2 = "http://example.org/sync/index.page.2.atom"
+ATOM_ID = "{%s}id" % ATOM
+
+def ids(entries):
+    return [entry.findtext(ATOM_ID) for entry in entries]
+
+
+class Test(unittest.TestCase):
+    def test_sync(self):
+        http = MockHttp(HTTP_SRC_DIR)
+        sync = CollectionSync(Context(http = http, collection = URI))
+
+        created, updated, deleted = sync.sync()
+        self.assertEqual(["http://example.org/sync/c", "http://example.org/sync/b", "http://example.org/sync/a"], ids(created))
+        self.assertEqual([], updated)
+        self.assertEqual([], deleted)
+        self.assertEqual(1, http.hit_counter["GET" + PAGE_2])
+
+        # Restore from pickled state, the way a polling daemon would.
+        sync = CollectionSync(Collection(Context(http = http, collection = URI)), pickle.loads(pickle.dumps(sync.state())))
+        created, updated, deleted = sync.sync()
+        self.assertEqual(["http://example.org/sync/d"], ids(created))
+        self.assertEqual(["http://example.org/sync/b"], ids(updated))
+        self.assertEqual([], deleted)
+        # Paging stopped before the second page.
+        self.assertEqual(1, http.hit_counter["GET" + PAGE_2])
+
+        created, updated, deleted = sync.sync(full=True)
+        self.assertEqual([], created)
+        self.assertEqual([], updated)
+        self.assertEqual(["http://example.org/sync/a"], deleted)
+        self.assertFalse("http://example.org/sync/a" in sync.known)
+        self.assertEqual("http://example.org/sync/b", sync.high_water[1])
+
+    def test_known(self):
+        http = MockHttp(HTTP_SRC_DIR)
+        known = {}
+        sync = CollectionSync(Context(http = http, collection = URI), known=known)
+        sync.sync()
+        self.assertTrue(sync.known is known)
+        self.assertEqual(3, len(known))
+
+        # The members of a restored state go into the given store.
+        restored = {}
+        sync = CollectionSync(Context(http = http, collection = URI), sync.state(), restored)
+        self.assertTrue(sync.known is restored)
+        self.assertEqual(known, restored)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import model
+from model import Context, Entry, ATOM_TITLE
+from mockhttp import MockHttp
+from treecache import TreeCache
+
+HTTP_SRC_DIR = "./tests/"
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.saved = model.tree_cache
+        model.tree_cache = TreeCache()
+
+    def tearDown(self):
+        model.tree_cache = self.saved
+
+    def test_off_by_default(self):
+        model.tree_cache = None
+        http = MockHttp(HTTP_SRC_DIR)
+        first = Entry(Context(http = http, entry = "http://example.org/images/77"))
+        second = Entry(Context(http = http, entry = "http://example.org/images/77"))
+        self.assertFalse(first.etree() is second.etree())
+
+    def test_lru(self):
+        cache = TreeCache(max_bytes=10)
+        cache.set("a", "1", 4, "tree a")
+        cache.set("b", "1", 4, "tree b")
+        self.assertEqual("tree a", cache.get("a", "1"))
+        cache.set("c", "1", 4, "tree c")
+        self.assertEqual(None, cache.get("b", "1"))
+        self.assertEqual("tree a", cache.get("a", "1"))
+        self.assertEqual(None, cache.get("a", "2"))
+        self.assertEqual(8, cache.size)
+        self.assertEqual({"hits": 2, "misses": 2, "entries": 2, "bytes": 8}, cache.stats())
+
+    def test_too_big(self):
+        cache = TreeCache(max_bytes=10)
+        cache.set("a", "1", 11, "tree a")
+        self.assertEqual(0, len(cache))
+
+    def test_shared_between_entries(self):
+        http = MockHttp(HTTP_SRC_DIR)
+        first = Entry(Context(http = http, entry = "http://example.org/images/77"))
+        first.get()
+        second = Entry(Context(http = http, entry = "http://example.org/images/77"))
+        second.get()
+        self.assertEqual(1, model.tree_cache.hits)
+        self.assertTrue(first._etree is second._etree)
+        self.assertTrue(second.has_media())
+
+    def test_copy_on_write(self):
+        http = MockHttp(HTTP_SRC_DIR)
+        first = Entry(Context(http = http, entry = "http://example.org/images/77"))
+        first.etree().find(ATOM_TITLE).text = "Changed"
+        second = Entry(Context(http = http, entry = "http://example.org/images/77"))
+        self.assertEqual("A Trip to the beach", second.etree().find(ATOM_TITLE).text)
+        self.assertEqual(1, model.tree_cache.hits)
+
+    def test_no_etag(self):
+        http = MockHttp(HTTP_SRC_DIR)
+        Entry(Context(http = http, entry = "http://example.org/entry/67")).get()
+        self.assertEqual(0, len(model.tree_cache))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+A size-bounded, least recently used cache of parsed
+ElementTree documents, keyed by URI and ETag.
+
+An ETag identifies one exact representation of a resource,
+so a tree parsed from a response with a given ETag can be
+handed out again for any later response from the same URI
+with the same ETag, skipping the call to fromstring().
+The trees are shared, so anyone holding one must treat
+it as read-only and copy it before making changes.
+
+The size of an entry is the length of the document
+it was parsed from, and the least recently used trees
+are dropped once the total goes over 'max_bytes'.
+The hit and miss counters can be used to size the cache.
+"""
+import threading
+
+from collections import OrderedDict
+
+
+class TreeCache(object):
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._trees = OrderedDict()
+
+    def get(self, uri, etag):
+        """
+        Returns the tree cached for (uri, etag), or None.
+        """
+        key = (uri, etag)
+        self._lock.acquire()
+        try:
+            if key in self._trees:
+                self.hits += 1
+                value = self._trees.pop(key)
+                self._trees[key] = value
+                return value[1]
+            self.misses += 1
+            return None
+        finally:
+            self._lock.release()
+
+    def set(self, uri, etag, size, etree):
+        """
+        Cache the tree 'etree' parsed from a document
+        of 'size' bytes retrieved from 'uri' with 'etag'.
+        """
+        key = (uri, etag)
+        if size > self.max_bytes:
+            return
+        self._lock.acquire()
+        try:
+            if key in self._trees:
+                self.size -= self._trees.pop(key)[0]
+            self._trees[key] = (size, etree)
+            self.size += size
+            while self.size > self.max_bytes:
+                oldest, (oldest_size, oldest_etree) = self._trees.popitem(last=False)
+                self.size -= oldest_size
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._trees.clear()
+            self.size = 0
+            self.hits = self.misses = 0
+        finally:
+            self._lock.release()
+
+    def __len__(self):
+        return len(self._trees)
+
+    def stats(self):
+        """
+        Returns a dictionary of the hits, misses,
+        number of trees and bytes currently cached.
+        """
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._trees), "bytes": self.size}
@@ -70,6 +70,16 @@ parser.add_option("--playback",
                   dest="playback",
                   metavar="DIR",
                   help="Playback responses stored from a previous run.")
+parser.add_option("--cache",
+                  dest="cache",
+                  metavar="DIR",
+                  help="Keep the HTTP cache in DIR instead of in memory.")
+parser.add_option("--cache-size",
+                  dest="cache_size",
+                  type="int",
+                  default=100,
+                  metavar="MB",
+                  help="Size in megabytes the HTTP cache is kept under.")
 
 
 options, cmd_line_args = parser.parse_args() 
@@ -110,20 +120,6 @@ def method_from_filters(filters):
     method = "DELETE"
   return method
 
-class MemoryCache:
-  mem = {}
-
-  def set(self, key, value):
-    self.mem[key] = value
-
-  def get(self, key):
-    return self.mem.get(key, None)
-
-  def delete(self, key):
-    if key in self.mem:
-      del self.mem[key]
-
-
 class Enum:
   def __init__(self, **entries):
     self.entries = entries
@@ -678,7 +674,11 @@ def main(options, cmd_line_args):
     if options.html:
         recorder.html = True
 
-    http = httplib2.Http(MemoryCache())
+    if options.cache:
+      cache = httplib2.ShardedFileCache(options.cache, options.cache_size * 1024 * 1024)
+    else:
+      cache = httplib2.MemoryCache(options.cache_size * 1024 * 1024)
+    http = httplib2.Http(cache)
     http.force_exception_to_status_code = False
 
     if options.credentials:
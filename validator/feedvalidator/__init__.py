@@ -167,8 +167,49 @@ def validateString(aString, firstOccurrenceOnly=0, fallback=None, base=""):
   else:
     return {"loggedEvents": loggedEvents}
 
-def validateURL(url, firstOccurrenceOnly=1, wantRawData=0):
-  """validate RSS from URL, returns events list, or (events, rawdata) tuple"""
+class _HttpResponse:
+  """
+  Make the (response, content) of an httplib2.Http
+  request look like the response of urllib2.urlopen().
+  """
+  def __init__(self, url, response, content):
+    from cStringIO import StringIO
+    self.headers = response
+    self.url = url
+    previous = response.previous
+    while previous is not None:
+      if previous.get('location'):
+        self.url = previous['location']
+        break
+      previous = previous.previous
+    self.fp = StringIO(content)
+
+  def read(self, size=-1):
+    return self.fp.read(size)
+
+  def geturl(self):
+    return self.url
+
+  def close(self):
+    pass
+
+def _httpopen(http, request):
+  """
+  Fetch a urllib2.Request with an httplib2.Http, raising
+  urllib2.HTTPError for error statuses as urlopen() does.
+  """
+  (response, content) = http.request(request.get_full_url(), headers=dict(request.header_items()))
+  usock = _HttpResponse(request.get_full_url(), response, content)
+  if response.status >= 400:
+    raise urllib2.HTTPError(usock.geturl(), response.status, response.reason, response, usock.fp)
+  return usock
+
+def validateURL(url, firstOccurrenceOnly=1, wantRawData=0, http=None):
+  """validate RSS from URL, returns events list, or (events, rawdata) tuple
+
+  If 'http' is given, such as an httplib2.PooledHttp shared
+  between threads, the feed is retrieved with it instead of
+  with urllib2."""
   loggedEvents = []
   request = urllib2.Request(url)
   request.add_header("Accept-encoding", "gzip, deflate")
@@ -176,7 +217,10 @@ def validateURL(url, firstOccurrenceOnly=1, wantRawData=0):
   usock = None
   try:
     try:
-      usock = urllib2.urlopen(request)
+      if http is not None:
+        usock = _httpopen(http, request)
+      else:
+        usock = urllib2.urlopen(request)
       rawdata = usock.read(MAXDATALENGTH)
       if usock.read(1):
         raise ValidationFailure(logging.ValidatorLimit({'limit': 'feed length > ' + str(MAXDATALENGTH) + ' bytes'}))
@@ -216,7 +260,8 @@ def validateURL(url, firstOccurrenceOnly=1, wantRawData=0):
       raise ValidationFailure(logging.IOError({"message": x.__class__.__name__,
         "exception":x}))
   
-    if usock.headers.get('content-encoding', None) == None:
+    # httplib2 decodes the content itself and renames the header.
+    if usock.headers.get('content-encoding', None) == None and usock.headers.get('-content-encoding', None) == None:
       loggedEvents.append(Uncompressed({}))
   
     if usock.headers.get('content-encoding', None) == 'gzip':
@@ -37,10 +37,12 @@ import httplib
 import urlparse
 import base64
 import os
-import copy
 import calendar
 import time
 import random
+import threading
+import tempfile
+from collections import OrderedDict
 # remove depracated warning in python2.6
 try:
     from hashlib import sha1 as _sha, md5 as _md5
@@ -88,6 +90,9 @@ __all__ = ['Http', 'Response', 'ProxyInfo', 'HttpLib2Error',
 # The httplib debug level, set to a non-zero value to get debug output
 debuglevel = 0
 
+# The most permanent redirects an Http remembers.
+MAX_PERMANENT_REDIRECTS = 1000
+
 
 # Python 2.3 support
 if sys.version_info < (2,4):
@@ -358,6 +363,119 @@ def _decompressContent(response, new_content):
         raise FailedToDecompressContent(_("Content purported to be compressed with %s but failed to decompress.") % response.get('content-encoding'), response, content)
     return content
 
+class _StreamingBody(object):
+    """The body of a response that is read from the connection as
+    it is consumed, decoding gzip or deflate content as it goes.
+
+    Returned by Http.request() in place of the content string when
+    it is called with stream=True. Read it with read() or iterate
+    over it for chunks, and close() it when done.
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(self, response, encoding=None):
+        self._response = response
+        self._decoder = None
+        if encoding == 'gzip':
+            self._decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            self._decoder = zlib.decompressobj()
+        self._buffer = ""
+        self._eof = False
+
+    def _fill(self, size):
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            data = self._response.read(self.chunk_size)
+            if not data:
+                self._eof = True
+                if self._decoder is not None:
+                    self._buffer += self._decoder.flush()
+                self._response.close()
+                break
+            if self._decoder is not None:
+                try:
+                    data = self._decoder.decompress(data)
+                except zlib.error:
+                    raise FailedToDecompressContent(_("Content purported to be compressed but failed to decompress."), None, "")
+            self._buffer += data
+
+    def read(self, size=-1):
+        self._fill(size)
+        if size < 0:
+            data, self._buffer = self._buffer, ""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def __iter__(self):
+        while True:
+            data = self.read(self.chunk_size)
+            if not data:
+                break
+            yield data
+
+    def close(self):
+        self._eof = True
+        self._buffer = ""
+        self._response.close()
+
+
+def _body_length(body):
+    """The number of bytes left to read from a file-like
+    request body, or None if that can't be known."""
+    try:
+        length = len(body)
+    except (TypeError, AttributeError):
+        try:
+            length = os.fstat(body.fileno()).st_size
+        except (AttributeError, OSError, IOError):
+            return None
+    if hasattr(body, 'tell'):
+        length -= body.tell()
+    return length
+
+
+class _ChunkedBody(object):
+    """Reads a request body with the chunked transfer-coding applied."""
+    def __init__(self, body):
+        self._body = body
+        self._done = False
+
+    def read(self, size=-1):
+        if self._done:
+            return ""
+        data = self._body.read(size)
+        if not data:
+            self._done = True
+            return "0\r\n\r\n"
+        return "%x\r\n%s\r\n" % (len(data), data)
+
+
+class _ProgressBody(object):
+    """Reads a request body, calling progress(sent, total)
+    after each block is read to be sent."""
+    def __init__(self, body, progress, total):
+        self._body = body
+        self._progress = progress
+        self._total = total
+        self._start = 0
+        if hasattr(body, 'tell'):
+            self._start = body.tell()
+            self.tell = body.tell
+        self._sent = 0
+
+    def read(self, size=-1):
+        data = self._body.read(size)
+        if data:
+            self._sent += len(data)
+            self._progress(self._sent, self._total)
+        return data
+
+    def seek(self, offset, whence=0):
+        self._body.seek(offset, whence)
+        self._sent = self._body.tell() - self._start
+
+
 def _updateCache(request_headers, response_headers, content, cache, cachekey):
     if cachekey:
         cc = _parse_cache_control(request_headers)
@@ -658,6 +776,253 @@ class FileCache(object):
         if os.path.exists(cacheFullPath):
             os.remove(cacheFullPath)
 
+class ShardedFileCache(object):
+    """Uses a local directory as a store for cached files, like
+    FileCache, but spreads the files over 256 * 256 subdirectories
+    and keeps the total size of the files under 'max_bytes' by
+    removing the least recently used ones.
+
+    Files are written to a temporary file and renamed into place,
+    so a reader never sees a partly written file. The sizes and
+    order of use are kept in memory, read from the directory the
+    first time they are needed, which is the first set() or the
+    first look at 'size', so opening a large cache only to read
+    from it is cheap. Reading a file marks it as used in the
+    directory too. With several processes sharing one directory
+    each only evicts the files it knows about.
+    """
+    def __init__(self, cache, max_bytes=100 * 1024 * 1024, safe=safename):
+        self.cache = cache
+        self.max_bytes = max_bytes
+        self.safe = safe
+        self._size = 0
+        self._lock = threading.Lock()
+        # Map the path of each file to its size, least recently
+        # used first, or None until the directory is scanned.
+        self._files = None
+        if not os.path.exists(cache):
+            os.makedirs(self.cache)
+
+    def _scan(self):
+        found = []
+        for dirpath, dirnames, filenames in os.walk(self.cache):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    if filename.startswith("."):
+                        # A temporary file left behind by an interrupted set().
+                        os.remove(path)
+                        continue
+                    stat = os.stat(path)
+                except OSError:
+                    # Removed by another thread or process.
+                    continue
+                found.append((stat.st_mtime, path, stat.st_size))
+        found.sort()
+        self._files = OrderedDict()
+        for mtime, path, size in found:
+            self._files[path] = size
+            self._size += size
+        self._evict()
+
+    def _known(self):
+        # Call with the lock held.
+        if self._files is None:
+            self._scan()
+        return self._files
+
+    def _evict(self):
+        while self._size > self.max_bytes:
+            oldest, size = self._files.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(oldest)
+            except OSError:
+                pass
+
+    def _get_size(self):
+        self._lock.acquire()
+        try:
+            self._known()
+            return self._size
+        finally:
+            self._lock.release()
+
+    size = property(_get_size, doc="The total size of the cached files.")
+
+    def _path(self, key):
+        digest = _md5(key.encode('utf-8') if isinstance(key, unicode) else key).hexdigest()
+        return os.path.join(self.cache, digest[0:2], digest[2:4], self.safe(key))
+
+    def _forget(self, path):
+        size = self._files.pop(path, None)
+        if size is not None:
+            self._size -= size
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            f = file(path, "rb")
+            retval = f.read()
+            f.close()
+        except IOError:
+            return None
+        self._lock.acquire()
+        try:
+            if self._files is not None and path in self._files:
+                self._files[path] = self._files.pop(path)
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+        finally:
+            self._lock.release()
+        return retval
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            self.delete(key)
+            return
+        self._lock.acquire()
+        try:
+            # Scan before writing, the scan removes temporary files.
+            self._known()
+        finally:
+            self._lock.release()
+        path = self._path(key)
+        dirname = os.path.dirname(path)
+        if not os.path.exists(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # Made by another thread or process.
+                pass
+        (fd, tmp) = tempfile.mkstemp(prefix=".", dir=dirname)
+        try:
+            written = 0
+            while written < len(value):
+                # os.write() may write less than it is given.
+                written += os.write(fd, buffer(value, written))
+            os.close(fd)
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp, path)
+        except:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._lock.acquire()
+        try:
+            self._forget(path)
+            self._files[path] = len(value)
+            self._size += len(value)
+            self._evict()
+        finally:
+            self._lock.release()
+
+    def delete(self, key):
+        path = self._path(key)
+        self._lock.acquire()
+        try:
+            if self._files is not None:
+                self._forget(path)
+        finally:
+            self._lock.release()
+        if os.path.exists(path):
+            os.remove(path)
+
+class MemoryCache(object):
+    """Keeps cached responses in memory. Safe to share between threads.
+
+    The least recently used entries are dropped once the total
+    size of the cached values goes over 'max_bytes'. If 'ttl' is
+    given, or passed to set(), entries are dropped that many
+    seconds after they were stored. The counts of hits, misses,
+    evictions and expiries are available from stats().
+    """
+    def __init__(self, max_bytes=16 * 1024 * 1024, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+        # Map each key to (value, expiry time or None), least recently used first.
+        self._entries = OrderedDict()
+
+    def _remove(self, key):
+        value, expires = self._entries.pop(key)
+        self.size -= len(value)
+
+    def get(self, key):
+        self._lock.acquire()
+        try:
+            if key in self._entries:
+                value, expires = self._entries.pop(key)
+                if expires is None or expires > time.time():
+                    self._entries[key] = (value, expires)
+                    self.hits += 1
+                    return value
+                self.size -= len(value)
+                self.expired += 1
+            self.misses += 1
+            return None
+        finally:
+            self._lock.release()
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        expires = None
+        if ttl is not None:
+            expires = time.time() + ttl
+        self._lock.acquire()
+        try:
+            if key in self._entries:
+                self._remove(key)
+            if len(value) > self.max_bytes:
+                return
+            self._entries[key] = (value, expires)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                oldest, (oldest_value, oldest_expires) = self._entries.popitem(last=False)
+                self.size -= len(oldest_value)
+                self.evictions += 1
+        finally:
+            self._lock.release()
+
+    def delete(self, key):
+        self._lock.acquire()
+        try:
+            if key in self._entries:
+                self._remove(key)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+            self.size = 0
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """Returns a dictionary of the hits, misses, hit rate,
+evictions, expiries, and the number and total size
+of the cached entries."""
+        self._lock.acquire()
+        try:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": lookups and float(self.hits) / lookups or 0.0,
+                    "evictions": self.evictions, "expired": self.expired,
+                    "entries": len(self._entries), "bytes": self.size}
+        finally:
+            self._lock.release()
+
 class Credentials(object):
     def __init__(self):
         self.credentials = []
@@ -814,6 +1179,10 @@ the same interface as FileCache."""
 
         self.ignore_etag = False
 
+        # Map URIs to the targets of the permanent redirects
+        # seen from them, which are then followed without asking.
+        self.permanent_redirects = {}
+
         self.force_exception_to_status_code = False
 
         self.timeout = timeout
@@ -844,10 +1213,28 @@ the same interface as FileCache."""
         self.credentials.clear()
         self.authorizations = []
 
-    def _conn_request(self, conn, request_uri, method, body, headers):
+    def _add_authorization(self, authorization):
+        self.authorizations.append(authorization)
+
+    def _add_permanent_redirect(self, uri, target):
+        if len(self.permanent_redirects) >= MAX_PERMANENT_REDIRECTS:
+            self.permanent_redirects.clear()
+        self.permanent_redirects[uri] = target
+
+    def _conn_request(self, conn, request_uri, method, body, headers, stream=False):
+        # A body read from a file has to be rewound before it
+        # can be sent again.
+        start = None
+        if hasattr(body, 'read') and hasattr(body, 'tell'):
+            start = body.tell()
         for i in range(2):
             try:
-                conn.request(method, request_uri, body, headers)
+                if start is not None:
+                    body.seek(start)
+                send_body = body
+                if headers.get('transfer-encoding') == 'chunked' and hasattr(body, 'read'):
+                    send_body = _ChunkedBody(body)
+                conn.request(method, request_uri, send_body, headers)
                 response = conn.getresponse()
             except socket.gaierror:
                 conn.close()
@@ -860,6 +1247,17 @@ the same interface as FileCache."""
                 else:
                     raise
             else:
+                if stream and 200 <= response.status < 300 and method != "HEAD":
+                    content = response
+                    response = Response(response)
+                    encoding = response.get('content-encoding', None)
+                    content = _StreamingBody(content, encoding)
+                    if encoding in ['gzip', 'deflate']:
+                        response['-content-encoding'] = response['content-encoding']
+                        del response['content-encoding']
+                        if response.has_key('content-length'):
+                            del response['content-length']
+                    break
                 content = response.read()
                 response = Response(response)
                 if method != "HEAD":
@@ -869,7 +1267,7 @@ the same interface as FileCache."""
         return (response, content)
 
 
-    def _request(self, conn, host, absolute_uri, request_uri, method, body, headers, redirections, cachekey):
+    def _request(self, conn, host, absolute_uri, request_uri, method, body, headers, redirections, cachekey, stream=False):
         """Do the actual request using the connection object
         and also follow one level of redirects if necessary"""
 
@@ -878,20 +1276,20 @@ the same interface as FileCache."""
         if auth:
             auth.request(method, request_uri, headers, body)
 
-        (response, content) = self._conn_request(conn, request_uri, method, body, headers)
+        (response, content) = self._conn_request(conn, request_uri, method, body, headers, stream)
 
         if auth:
             if auth.response(response, body):
                 auth.request(method, request_uri, headers, body)
-                (response, content) = self._conn_request(conn, request_uri, method, body, headers )
+                (response, content) = self._conn_request(conn, request_uri, method, body, headers, stream)
                 response._stale_digest = 1
 
         if response.status == 401:
             for authorization in self._auth_from_challenge(host, request_uri, headers, response, content):
                 authorization.request(method, request_uri, headers, body)
-                (response, content) = self._conn_request(conn, request_uri, method, body, headers, )
+                (response, content) = self._conn_request(conn, request_uri, method, body, headers, stream)
                 if response.status != 401:
-                    self.authorizations.append(authorization)
+                    self._add_authorization(authorization)
                     authorization.response(response, body)
                     break
 
@@ -918,16 +1316,14 @@ the same interface as FileCache."""
                     if headers.has_key('if-modified-since'):
                         del headers['if-modified-since']
                     if response.has_key('location'):
-                        location = response['location']
-                        old_response = copy.deepcopy(response)
-                        if not old_response.has_key('content-location'):
-                            old_response['content-location'] = absolute_uri
+                        if not response.has_key('content-location'):
+                            response['content-location'] = absolute_uri
                         redirect_method = ((response.status == 303) and (method not in ["GET", "HEAD"])) and "GET" or method
-                        (response, content) = self.request(location, redirect_method, body=body, headers = headers, redirections = redirections - 1)
-                        response.previous = old_response
+                        # request() follows the redirect.
+                        response._redirect_to = (response['location'], redirect_method)
                 else:
                     raise RedirectLimit( _("Redirected more times than rediection_limit allows."), response, content)
-            elif response.status in [200, 203] and method == "GET":
+            elif response.status in [200, 203] and method == "GET" and not isinstance(content, _StreamingBody):
                 # Don't cache 206's since we aren't going to handle byte range requests
                 if not response.has_key('content-location'):
                     response['content-location'] = absolute_uri
@@ -941,7 +1337,7 @@ the same interface as FileCache."""
 # including all socket.* and httplib.* exceptions.
 
 
-    def request(self, uri, method="GET", body=None, headers=None, redirections=DEFAULT_MAX_REDIRECTS, connection_type=None):
+    def request(self, uri, method="GET", body=None, headers=None, redirections=DEFAULT_MAX_REDIRECTS, connection_type=None, stream=False, progress=None):
         """ Performs a single HTTP request.
 The 'uri' is the URI of the HTTP resource and can begin
 with either 'http' or 'https'. The value of 'uri' must be an absolute URI.
@@ -949,8 +1345,13 @@ with either 'http' or 'https'. The value of 'uri' must be an absolute URI.
 The 'method' is the HTTP method to perform, such as GET, POST, DELETE, etc.
 There is no restriction on the methods allowed.
 
-The 'body' is the entity body to be sent with the request. It is a string
-object.
+The 'body' is the entity body to be sent with the request. It is a string,
+or a file object or mmap which is read and sent a block at a time. If
+no Content-Length is given one is worked out for files and mmaps, and
+other file-like objects are sent with chunked transfer-coding.
+If 'progress' is given it is called as progress(sent, total) as
+the blocks of such a body are sent, with 'total' None if it is
+not known.
 
 Any extra headers that are to be sent with the request should be provided in the
 'headers' dictionary.
@@ -961,6 +1362,10 @@ exception is 'redirections. The default is 5.
 The return value is a tuple of (response, content), the first
 being and instance of the 'Response' class, the second being
 a string that contains the response entity body.
+
+If 'stream' is True then the content is instead a file-like
+object that reads the body from the connection as it is
+consumed. Streamed bodies are not stored in the cache.
         """
         try:
             if headers is None:
@@ -971,122 +1376,67 @@ a string that contains the response entity body.
             if not headers.has_key('user-agent'):
                 headers['user-agent'] = "Python-httplib2/%s" % __version__
 
-            uri = iri2uri(uri)
-
-            (scheme, authority, request_uri, defrag_uri) = urlnorm(uri)
-            domain_port = authority.split(":")[0:2]
-            if len(domain_port) == 2 and domain_port[1] == '443' and scheme == 'http':
-                scheme = 'https'
-                authority = domain_port[0]
-
-            conn_key = scheme+":"+authority
-            if conn_key in self.connections:
-                conn = self.connections[conn_key]
-            else:
-                if not connection_type:
-                    connection_type = (scheme == 'https') and HTTPSConnectionWithTimeout or HTTPConnectionWithTimeout
-                certs = list(self.certificates.iter(authority))
-                if scheme == 'https' and certs:
-                    conn = self.connections[conn_key] = connection_type(authority, key_file=certs[0][0],
-                        cert_file=certs[0][1], timeout=self.timeout, proxy_info=self.proxy_info)
-                else:
-                    conn = self.connections[conn_key] = connection_type(authority, timeout=self.timeout, proxy_info=self.proxy_info)
-                conn.set_debuglevel(debuglevel)
-
-            if method in ["GET", "HEAD"] and 'range' not in headers and 'accept-encoding' not in headers:
-                headers['accept-encoding'] = 'deflate, gzip'
-
-            info = email.Message.Message()
-            cached_value = None
-            if self.cache:
-                cachekey = defrag_uri
-                cached_value = self.cache.get(cachekey)
-                if cached_value:
-                    # info = email.message_from_string(cached_value)
-                    #
-                    # Need to replace the line above with the kludge below
-                    # to fix the non-existent bug not fixed in this
-                    # bug report: http://mail.python.org/pipermail/python-bugs-list/2005-September/030289.html
-                    try:
-                        info, content = cached_value.split('\r\n\r\n', 1)
-                        feedparser = email.FeedParser.FeedParser()
-                        feedparser.feed(info)
-                        info = feedparser.close()
-                        feedparser._parse = None
-                    except IndexError:
-                        self.cache.delete(cachekey)
-                        cachekey = None
-                        cached_value = None
-            else:
-                cachekey = None
-
-            if method in self.optimistic_concurrency_methods and self.cache and info.has_key('etag') and not self.ignore_etag and 'if-match' not in headers:
-                # http://www.w3.org/1999/04/Editing/
-                headers['if-match'] = info['etag']
-
-            if method not in ["GET", "HEAD"] and self.cache and cachekey:
-                # RFC 2616 Section 13.10
-                self.cache.delete(cachekey)
-
-            if cached_value and method in ["GET", "HEAD"] and self.cache and 'range' not in headers:
-                if info.has_key('-x-permanent-redirect-url'):
-                    # Should cached permanent redirects be counted in our redirection count? For now, yes.
-                    (response, new_content) = self.request(info['-x-permanent-redirect-url'], "GET", headers = headers, redirections = redirections - 1)
-                    response.previous = Response(info)
-                    response.previous.fromcache = True
-                else:
-                    # Determine our course of action:
-                    #   Is the cached entry fresh or stale?
-                    #   Has the client requested a non-cached response?
-                    #
-                    # There seems to be three possible answers:
-                    # 1. [FRESH] Return the cache entry w/o doing a GET
-                    # 2. [STALE] Do the GET (but add in cache validators if available)
-                    # 3. [TRANSPARENT] Do a GET w/o any cache validators (Cache-Control: no-cache) on the request
-                    entry_disposition = _entry_disposition(info, headers)
-
-                    if entry_disposition == "FRESH":
-                        if not cached_value:
-                            info['status'] = '504'
-                            content = ""
-                        response = Response(info)
-                        if cached_value:
-                            response.fromcache = True
-                        return (response, content)
-
-                    if entry_disposition == "STALE":
-                        if info.has_key('etag') and not self.ignore_etag and not 'if-none-match' in headers:
-                            headers['if-none-match'] = info['etag']
-                        if info.has_key('last-modified') and not 'last-modified' in headers:
-                            headers['if-modified-since'] = info['last-modified']
-                    elif entry_disposition == "TRANSPARENT":
-                        pass
-
-                    (response, new_content) = self._request(conn, authority, uri, request_uri, method, body, headers, redirections, cachekey)
-
-                if response.status == 304 and method == "GET":
-                    # Rewrite the cache entry with the new end-to-end headers
-                    # Take all headers that are in response
-                    # and overwrite their values in info.
-                    # unless they are hop-by-hop, or are listed in the connection header.
-
-                    for key in _get_end2end_headers(response):
-                        info[key] = response[key]
-                    merged_response = Response(info)
-                    if hasattr(response, "_stale_digest"):
-                        merged_response._stale_digest = response._stale_digest
-                    _updateCache(headers, merged_response, content, self.cache, cachekey)
-                    response = merged_response
-                    response.status = 200
+            if hasattr(body, 'read'):
+                if 'content-length' not in headers and 'transfer-encoding' not in headers:
+                    length = _body_length(body)
+                    if length is None:
+                        headers['transfer-encoding'] = 'chunked'
+                    else:
+                        headers['content-length'] = str(length)
+                if progress is not None:
+                    total = headers.get('content-length')
+                    body = _ProgressBody(body, progress, total and int(total))
+
+            # Redirects are followed here, one hop per time around
+            # the loop, with each redirect response linked to the
+            # one before it through 'previous'.
+            previous = None
+            while True:
+                uri = iri2uri(uri)
+
+                (scheme, authority, request_uri, defrag_uri) = urlnorm(uri)
+                domain_port = authority.split(":")[0:2]
+                if len(domain_port) == 2 and domain_port[1] == '443' and scheme == 'http':
+                    scheme = 'https'
+                    authority = domain_port[0]
+
+                target = None
+                if method in ["GET", "HEAD"] and self.follow_redirects:
+                    target = self.permanent_redirects.get(defrag_uri)
+                if target:
+                    response = Response({'status': '301', 'location': target, 'content-location': uri})
                     response.fromcache = True
-
-                elif response.status == 200:
-                    content = new_content
+                    response._redirect_to = (target, method)
+                    content = ""
                 else:
-                    self.cache.delete(cachekey)
-                    content = new_content
-            else:
-                (response, content) = self._request(conn, authority, uri, request_uri, method, body, headers, redirections, cachekey)
+                    conn_key = scheme+":"+authority
+                    conn = self._get_connection(conn_key, scheme, authority, connection_type)
+                    try:
+                        (response, content) = self._request_on(conn, authority, uri, request_uri, defrag_uri, method, body, headers, redirections, stream)
+                    except:
+                        conn.close()
+                        self._release_connection(conn_key, conn)
+                        raise
+                    # A streamed body keeps the connection until it has been read.
+                    self._release_connection(conn_key, conn, not isinstance(content, _StreamingBody))
+
+                redirect_to = getattr(response, '_redirect_to', None)
+                if redirect_to is None:
+                    break
+                del response._redirect_to
+                if redirections <= 0:
+                    raise RedirectLimit( _("Redirected more times than rediection_limit allows."), response, content)
+                if response.status == 301 and method in ["GET", "HEAD"]:
+                    self._add_permanent_redirect(defrag_uri, redirect_to[0])
+                response.previous = previous
+                previous = response
+                (uri, method) = redirect_to
+                redirections -= 1
+            if previous is not None:
+                response.previous = previous
+            if stream and not isinstance(content, _StreamingBody):
+                content = StringIO.StringIO(content)
+            return (response, content)
         except Exception, e:
             if self.force_exception_to_status_code:
                 if isinstance(e, HttpLib2ErrorWithResponse):
@@ -1116,6 +1466,288 @@ a string that contains the response entity body.
 
         return (response, content)
 
+    def _get_connection(self, conn_key, scheme, authority, connection_type):
+        """Returns the connection to use for a request to
+        'authority', making it if there isn't one yet."""
+        if conn_key in self.connections:
+            return self.connections[conn_key]
+        conn = self.connections[conn_key] = self._new_connection(scheme, authority, connection_type)
+        return conn
+
+    def _new_connection(self, scheme, authority, connection_type):
+        if not connection_type:
+            connection_type = (scheme == 'https') and HTTPSConnectionWithTimeout or HTTPConnectionWithTimeout
+        certs = list(self.certificates.iter(authority))
+        if scheme == 'https' and certs:
+            conn = connection_type(authority, key_file=certs[0][0],
+                cert_file=certs[0][1], timeout=self.timeout, proxy_info=self.proxy_info)
+        else:
+            conn = connection_type(authority, timeout=self.timeout, proxy_info=self.proxy_info)
+        conn.set_debuglevel(debuglevel)
+        return conn
+
+    def _release_connection(self, conn_key, conn, reusable=True):
+        """Called when a request is done with the connection
+        returned from _get_connection(). If it is not 'reusable'
+        the connection now belongs to a streamed body."""
+        if not reusable and self.connections.get(conn_key) is conn:
+            del self.connections[conn_key]
+
+    def _request_on(self, conn, authority, uri, request_uri, defrag_uri, method, body, headers, redirections, stream=False):
+        """Perform the request over the connection 'conn', going
+        through the cache."""
+        if method in ["GET", "HEAD"] and 'range' not in headers and 'accept-encoding' not in headers:
+            headers['accept-encoding'] = 'deflate, gzip'
+
+        info = email.Message.Message()
+        cached_value = None
+        if self.cache:
+            cachekey = defrag_uri
+            cached_value = self.cache.get(cachekey)
+            if cached_value:
+                # info = email.message_from_string(cached_value)
+                #
+                # Need to replace the line above with the kludge below
+                # to fix the non-existent bug not fixed in this
+                # bug report: http://mail.python.org/pipermail/python-bugs-list/2005-September/030289.html
+                try:
+                    info, content = cached_value.split('\r\n\r\n', 1)
+                    feedparser = email.FeedParser.FeedParser()
+                    feedparser.feed(info)
+                    info = feedparser.close()
+                    feedparser._parse = None
+                except IndexError:
+                    self.cache.delete(cachekey)
+                    cachekey = None
+                    cached_value = None
+        else:
+            cachekey = None
+
+        if method in self.optimistic_concurrency_methods and self.cache and info.has_key('etag') and not self.ignore_etag and 'if-match' not in headers:
+            # http://www.w3.org/1999/04/Editing/
+            headers['if-match'] = info['etag']
+
+        if method not in ["GET", "HEAD"] and self.cache and cachekey:
+            # RFC 2616 Section 13.10
+            self.cache.delete(cachekey)
+
+        if cached_value and method in ["GET", "HEAD"] and self.cache and 'range' not in headers:
+            if info.has_key('-x-permanent-redirect-url'):
+                # Should cached permanent redirects be counted in our redirection count? For now, yes.
+                response = Response(info)
+                response.fromcache = True
+                response._redirect_to = (info['-x-permanent-redirect-url'], "GET")
+                return (response, "")
+            else:
+                # Determine our course of action:
+                #   Is the cached entry fresh or stale?
+                #   Has the client requested a non-cached response?
+                #
+                # There seems to be three possible answers:
+                # 1. [FRESH] Return the cache entry w/o doing a GET
+                # 2. [STALE] Do the GET (but add in cache validators if available)
+                # 3. [TRANSPARENT] Do a GET w/o any cache validators (Cache-Control: no-cache) on the request
+                entry_disposition = _entry_disposition(info, headers)
+
+                if entry_disposition == "FRESH":
+                    if not cached_value:
+                        info['status'] = '504'
+                        content = ""
+                    response = Response(info)
+                    if cached_value:
+                        response.fromcache = True
+                    return (response, content)
+
+                if entry_disposition == "STALE":
+                    if info.has_key('etag') and not self.ignore_etag and not 'if-none-match' in headers:
+                        headers['if-none-match'] = info['etag']
+                    if info.has_key('last-modified') and not 'last-modified' in headers:
+                        headers['if-modified-since'] = info['last-modified']
+                elif entry_disposition == "TRANSPARENT":
+                    pass
+
+                (response, new_content) = self._request(conn, authority, uri, request_uri, method, body, headers, redirections, cachekey, stream)
+
+            if response.status == 304 and method == "GET":
+                # Rewrite the cache entry with the new end-to-end headers
+                # Take all headers that are in response
+                # and overwrite their values in info.
+                # unless they are hop-by-hop, or are listed in the connection header.
+
+                for key in _get_end2end_headers(response):
+                    info[key] = response[key]
+                merged_response = Response(info)
+                if hasattr(response, "_stale_digest"):
+                    merged_response._stale_digest = response._stale_digest
+                _updateCache(headers, merged_response, content, self.cache, cachekey)
+                response = merged_response
+                response.status = 200
+                response.fromcache = True
+
+            elif response.status == 200:
+                content = new_content
+            else:
+                if not response.has_key('-x-permanent-redirect-url'):
+                    self.cache.delete(cachekey)
+                content = new_content
+        else:
+            (response, content) = self._request(conn, authority, uri, request_uri, method, body, headers, redirections, cachekey, stream)
+        return (response, content)
+
+
+
+class PooledHttp(Http):
+    """An Http that can be shared between threads.
+
+Instead of one connection per host it keeps a pool of up to
+'max_per_host' keep-alive connections for each host and
+'max_total' connections in all. A request takes an idle
+connection from the pool, or opens a new one if the limits
+allow, or else waits for a connection to be returned.
+Connections left idle for more than 'idle_timeout' seconds
+are closed.
+
+Requests made while the same thread already holds a connection,
+such as when following a redirect, are not held to the limits
+so that they cannot wait on themselves.
+
+The authorizations and permanent redirects learned by one thread
+are used by all of them, and are updated under a lock. Credentials,
+certificates and the other settings should be set up before the
+PooledHttp is shared.
+    """
+    def __init__(self, cache=None, timeout=None, proxy_info=None, max_per_host=4, max_total=32, idle_timeout=60):
+        Http.__init__(self, cache, timeout, proxy_info)
+        self.max_per_host = max_per_host
+        self.max_total = max_total
+        self.idle_timeout = idle_timeout
+        self._pool = threading.Condition()
+        # Map conn_key to a list of (connection, time returned), most recent last.
+        self._idle = {}
+        # Map conn_key to the number of connections in use.
+        self._busy = {}
+        self._held = threading.local()
+        # Guards authorizations and permanent_redirects.
+        self._learned = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+        self.waits = 0
+
+    def _add_authorization(self, authorization):
+        self._learned.acquire()
+        try:
+            # Copy on write, so that other threads can go on
+            # looking through the list without the lock.
+            self.authorizations = self.authorizations + [authorization]
+        finally:
+            self._learned.release()
+
+    def _add_permanent_redirect(self, uri, target):
+        self._learned.acquire()
+        try:
+            Http._add_permanent_redirect(self, uri, target)
+        finally:
+            self._learned.release()
+
+    def _total(self):
+        return sum(self._busy.values()) + sum([len(idle) for idle in self._idle.values()])
+
+    def _evict(self, now):
+        for conn_key, idle in self._idle.items():
+            while idle and now - idle[0][1] > self.idle_timeout:
+                idle.pop(0)[0].close()
+                self.evicted += 1
+            if not idle:
+                del self._idle[conn_key]
+
+    def _evict_oldest(self):
+        oldest = None
+        for conn_key, idle in self._idle.items():
+            if oldest is None or idle[0][1] < self._idle[oldest][0][1]:
+                oldest = conn_key
+        if oldest is None:
+            return False
+        self._idle[oldest].pop(0)[0].close()
+        if not self._idle[oldest]:
+            del self._idle[oldest]
+        self.evicted += 1
+        return True
+
+    def _get_connection(self, conn_key, scheme, authority, connection_type):
+        nested = getattr(self._held, "count", 0) > 0
+        self._pool.acquire()
+        try:
+            waited = False
+            while True:
+                self._evict(time.time())
+                idle = self._idle.get(conn_key)
+                if idle:
+                    conn = idle.pop()[0]
+                    if not idle:
+                        del self._idle[conn_key]
+                    self.reused += 1
+                    break
+                if nested or self._busy.get(conn_key, 0) < self.max_per_host:
+                    if nested or self._total() < self.max_total or self._evict_oldest():
+                        conn = None
+                        self.created += 1
+                        break
+                if not waited:
+                    self.waits += 1
+                    waited = True
+                self._pool.wait(self.idle_timeout)
+            self._busy[conn_key] = self._busy.get(conn_key, 0) + 1
+        finally:
+            self._pool.release()
+        self._held.count = getattr(self._held, "count", 0) + 1
+        if conn is None:
+            try:
+                conn = self._new_connection(scheme, authority, connection_type)
+            except:
+                self._release_connection(conn_key, None)
+                raise
+        return conn
+
+    def _release_connection(self, conn_key, conn, reusable=True):
+        self._held.count -= 1
+        self._pool.acquire()
+        try:
+            self._busy[conn_key] -= 1
+            if not self._busy[conn_key]:
+                del self._busy[conn_key]
+            if conn is not None and reusable:
+                if self._total() < self.max_total:
+                    self._idle.setdefault(conn_key, []).append((conn, time.time()))
+                else:
+                    conn.close()
+            self._pool.notifyAll()
+        finally:
+            self._pool.release()
+
+    def close(self):
+        """Close all the idle connections."""
+        self._pool.acquire()
+        try:
+            for idle in self._idle.values():
+                for conn, returned in idle:
+                    conn.close()
+            self._idle = {}
+        finally:
+            self._pool.release()
+
+    def stats(self):
+        """Returns a dictionary of the connections created
+and reused, idle connections closed, the number of
+requests that had to wait for a connection, and the
+connections now busy and idle."""
+        self._pool.acquire()
+        try:
+            return {"created": self.created, "reused": self.reused, "evicted": self.evicted, "waits": self.waits,
+                    "busy": sum(self._busy.values()),
+                    "idle": sum([len(idle) for idle in self._idle.values()])}
+        finally:
+            self._pool.release()
 
 
 class Response(dict):
@@ -1,7 +1,31 @@
 from subprocess import Popen, PIPE
+import glob
+import os
 import unittest
+from trace import fullmodname
+import httplib2
+import testserver
+import feedvalidator
+from feedvalidator.logging import TYPE_ATOM, HttpError
 from appclienttest import msg
 
+FEED = """<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <title>Example Feed</title>
+  <link href="http://example.org/"/>
+  <updated>2003-12-13T18:30:02Z</updated>
+  <author><name>John Doe</name></author>
+  <id>urn:uuid:60a76c80-d399-11d9-b93C-0003939e0af6</id>
+</feed>"""
+
+
+class FeedHandler(testserver.Handler):
+    def do_GET(self):
+        if self.path == "/feed":
+            self.send_body(FEED, headers={"Content-Type": "application/atom+xml"})
+        else:
+            self.send_body("Not found", 404, {"Content-Type": "application/atom+xml"})
+
 
 class Test(unittest.TestCase):
     def _parse(self, output):
@@ -49,6 +73,36 @@ class Test(unittest.TestCase):
         self.assertTrue(("Warning", msg.HTTP_LAST_MODIFIED) in parsed)
         self.assertTrue(("Error", msg.CREATE_RETURNS_LOCATION) in parsed)
 
+    def testValidateURLWithHttp(self):
+        """
+        The feed is retrieved with the http object given
+        to validateURL(), and an error status is logged
+        as it is when urllib2 is used.
+        """
+        server, base = testserver.serve(FeedHandler)
+        try:
+            http = httplib2.PooledHttp()
+            result = feedvalidator.validateURL(base + "/feed", http=http)
+            self.assertEqual(TYPE_ATOM, result["feedType"])
+            self.assertEqual(1, http.stats()["created"])
+            result = feedvalidator.validateURL(base + "/missing", http=http)
+            errors = [event for event in result["loggedEvents"] if isinstance(event, HttpError)]
+            self.assertEqual(404, errors[0].params["status"].code)
+            self.assertEqual(1, http.stats()["created"])
+            http.close()
+        finally:
+            testserver.stop(server)
+
+
+def suite():
+    """
+    These tests and those of the bundled libraries in tests/.
+    """
+    paths = glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests', 'test_*.py'))
+    loader = unittest.TestLoader()
+    return unittest.TestSuite([loader.loadTestsFromTestCase(Test),
+        loader.loadTestsFromNames(map(fullmodname, paths))])
+
 
 if __name__ == "__main__":
-    unittest.main()
+    unittest.main(defaultTest="suite")
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+import httplib2
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def files(self):
+        return [filename for dirpath, dirnames, filenames in os.walk(self.dir) for filename in filenames]
+
+    def test_get_set_delete(self):
+        cache = httplib2.ShardedFileCache(self.dir)
+        self.assertEqual(None, cache.get("http://example.org/a"))
+        cache.set("http://example.org/a", "aaaa")
+        self.assertEqual("aaaa", cache.get("http://example.org/a"))
+        self.assertEqual(1, len(self.files()))
+        self.assertNotEqual(self.dir, os.path.dirname(cache._path("http://example.org/a")))
+        cache.set("http://example.org/a", "aa")
+        self.assertEqual(2, cache.size)
+        cache.delete("http://example.org/a")
+        self.assertEqual(None, cache.get("http://example.org/a"))
+        self.assertEqual(0, cache.size)
+        self.assertEqual([], self.files())
+
+    def test_lru(self):
+        cache = httplib2.ShardedFileCache(self.dir, max_bytes=10)
+        cache.set("http://example.org/a", "aaaa")
+        cache.set("http://example.org/b", "bbbb")
+        cache.get("http://example.org/a")
+        cache.set("http://example.org/c", "cccc")
+        self.assertEqual(None, cache.get("http://example.org/b"))
+        self.assertEqual("aaaa", cache.get("http://example.org/a"))
+        self.assertEqual(8, cache.size)
+        cache.set("http://example.org/d", "d" * 11)
+        self.assertEqual(None, cache.get("http://example.org/d"))
+
+        reopened = httplib2.ShardedFileCache(self.dir, max_bytes=10)
+        self.assertEqual(8, reopened.size)
+        self.assertEqual("cccc", reopened.get("http://example.org/c"))
+
+    def test_leftover_temporary_file(self):
+        cache = httplib2.ShardedFileCache(self.dir)
+        cache.set("http://example.org/a", "aaaa")
+        f = file(os.path.join(os.path.dirname(cache._path("http://example.org/a")), ".tmp"), "w")
+        f.write("partial")
+        f.close()
+        reopened = httplib2.ShardedFileCache(self.dir)
+        reopened.set("http://example.org/b", "bbbb")
+        self.assertEqual(2, len(self.files()))
+        self.assertEqual(8, reopened.size)
+
+    def test_scan_lazily(self):
+        cache = httplib2.ShardedFileCache(self.dir)
+        cache.set("http://example.org/a", "aaaa")
+        cache.set("http://example.org/b", "bbbb")
+        os.utime(cache._path("http://example.org/a"), (1000, 1000))
+        os.utime(cache._path("http://example.org/b"), (2000, 2000))
+        reopened = httplib2.ShardedFileCache(self.dir, max_bytes=6)
+        self.assertEqual("aaaa", reopened.get("http://example.org/a"))
+        self.assertEqual(None, reopened._files)
+        # The scan evicts what no longer fits, b was used last.
+        self.assertEqual(4, reopened.size)
+        self.assertEqual(None, reopened.get("http://example.org/b"))
+        self.assertEqual(1, len(self.files()))
+
+    def test_short_write(self):
+        write = os.write
+        def short(fd, data):
+            return write(fd, buffer(data, 0, 3))
+        cache = httplib2.ShardedFileCache(self.dir)
+        os.write = short
+        try:
+            cache.set("http://example.org/a", "abcdefgh")
+        finally:
+            os.write = write
+        self.assertEqual("abcdefgh", cache.get("http://example.org/a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
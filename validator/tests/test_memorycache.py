@@ -0,0 +1,45 @@
+import time
+import unittest
+import httplib2
+
+
+class Test(unittest.TestCase):
+    def test_lru(self):
+        cache = httplib2.MemoryCache(max_bytes=10)
+        cache.set("a", "aaaa")
+        cache.set("b", "bbbb")
+        self.assertEqual("aaaa", cache.get("a"))
+        cache.set("c", "cccc")
+        self.assertEqual(None, cache.get("b"))
+        self.assertEqual(8, cache.size)
+        cache.set("d", "d" * 11)
+        self.assertEqual(None, cache.get("d"))
+        cache.delete("a")
+        self.assertEqual(4, cache.size)
+        stats = cache.stats()
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(2, stats["misses"])
+        self.assertEqual(1, stats["evictions"])
+        self.assertEqual(1, stats["entries"])
+
+    def test_empty_cache_is_used(self):
+        # Http checks 'if self.cache', so an empty cache must not be false.
+        self.assertTrue(httplib2.MemoryCache())
+
+    def test_instances_are_separate(self):
+        first = httplib2.MemoryCache()
+        first.set("a", "aaaa")
+        self.assertEqual(None, httplib2.MemoryCache().get("a"))
+
+    def test_ttl(self):
+        cache = httplib2.MemoryCache(ttl=60)
+        cache.set("a", "aaaa")
+        cache.set("b", "bbbb", ttl=-1)
+        self.assertEqual("aaaa", cache.get("a"))
+        self.assertEqual(None, cache.get("b"))
+        self.assertEqual(1, cache.stats()["expired"])
+        self.assertEqual(4, cache.size)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+import httplib2
+import testserver
+
+
+class Handler(testserver.Handler):
+    def do_GET(self):
+        self.send_body(self.path)
+
+
+class Test(testserver.ServerTestCase):
+    handler = Handler
+
+    def test_reuse(self):
+        http = httplib2.PooledHttp()
+        for i in range(3):
+            response, content = http.request(self.base + "/entry/%d" % i)
+            self.assertEqual(200, response.status)
+            self.assertEqual("/entry/%d" % i, content)
+        stats = http.stats()
+        self.assertEqual(1, stats["created"])
+        self.assertEqual(2, stats["reused"])
+        self.assertEqual(1, stats["idle"])
+        self.assertEqual(0, stats["busy"])
+        http.close()
+        self.assertEqual(0, http.stats()["idle"])
+
+    def test_idle_timeout(self):
+        http = httplib2.PooledHttp(idle_timeout=0)
+        http.request(self.base + "/entry/1")
+        http.request(self.base + "/entry/2")
+        stats = http.stats()
+        self.assertEqual(2, stats["created"])
+        self.assertEqual(1, stats["evicted"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import httplib2
+import testserver
+
+# Maps a path to the (status, location) of its redirect.
+REDIRECTS = {
+    "/a": (302, "/b"),
+    "/b": (301, "/c"),
+    "/loop": (302, "/loop"),
+}
+
+
+class Handler(testserver.Handler):
+    hits = []
+    commands = []
+
+    def do_GET(self):
+        self.hits.append(self.path)
+        self.commands.append(self.command)
+        if self.path in REDIRECTS:
+            status, location = REDIRECTS[self.path]
+            self.send_body("", status, {"Location": location})
+        else:
+            self.send_body("done")
+
+    do_HEAD = do_GET
+
+
+class Test(testserver.ServerTestCase):
+    handler = Handler
+
+    def setUp(self):
+        Handler.hits = []
+        Handler.commands = []
+        testserver.ServerTestCase.setUp(self)
+
+    def test_chain(self):
+        http = httplib2.Http()
+        response, content = http.request(self.base + "/a")
+        self.assertEqual(200, response.status)
+        self.assertEqual("done", content)
+        self.assertEqual(301, response.previous.status)
+        self.assertEqual(self.base + "/b", response.previous['content-location'])
+        self.assertEqual(302, response.previous.previous.status)
+        self.assertEqual(None, response.previous.previous.previous)
+        self.assertEqual(["/a", "/b", "/c"], Handler.hits)
+
+    def test_permanent_redirect_remembered(self):
+        http = httplib2.Http()
+        http.request(self.base + "/b")
+        response, content = http.request(self.base + "/b")
+        self.assertEqual(200, response.status)
+        self.assertTrue(response.previous.fromcache)
+        self.assertEqual(["/b", "/c", "/c"], Handler.hits)
+
+    def test_permanent_redirect_remembered_head(self):
+        http = httplib2.Http()
+        http.request(self.base + "/b", "HEAD")
+        response, content = http.request(self.base + "/b", "HEAD")
+        self.assertEqual(200, response.status)
+        self.assertTrue(response.previous.fromcache)
+        self.assertEqual(["/b", "/c", "/c"], Handler.hits)
+        self.assertEqual(["HEAD", "HEAD", "HEAD"], Handler.commands)
+
+    def test_permanent_redirect_cached(self):
+        cache = httplib2.MemoryCache()
+        httplib2.Http(cache).request(self.base + "/a")
+        response, content = httplib2.Http(cache).request(self.base + "/a")
+        self.assertEqual("done", content)
+        self.assertTrue(response.previous.fromcache)
+        self.assertEqual(302, response.previous.previous.status)
+        self.assertEqual(["/a", "/b", "/c", "/a", "/c"], Handler.hits)
+
+    def test_limit(self):
+        http = httplib2.Http()
+        self.assertRaises(httplib2.RedirectLimit, http.request, self.base + "/loop", redirections=3)
+        self.assertEqual(4, len(Handler.hits))
+
+
+if __name__ == "__main__":
+    unittest.main()
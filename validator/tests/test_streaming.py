@@ -0,0 +1,110 @@
+import gzip
+import tempfile
+import unittest
+from StringIO import StringIO
+import httplib2
+import testserver
+
+MEDIA = "".join([chr(i % 256) for i in range(300000)])
+
+
+class Handler(testserver.Handler):
+    received = []
+
+    def do_GET(self):
+        if self.path == "/gzip":
+            compressed = StringIO()
+            f = gzip.GzipFile(fileobj=compressed, mode="wb")
+            f.write(MEDIA)
+            f.close()
+            self.send_body(compressed.getvalue(), headers={"Content-Encoding": "gzip"})
+        else:
+            self.send_body(MEDIA)
+
+    def do_PUT(self):
+        if self.headers.get("transfer-encoding") == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+                if not size:
+                    break
+            self.received.append("".join(chunks))
+        else:
+            self.received.append(self.rfile.read(int(self.headers["content-length"])))
+        self.send_body("")
+
+
+class Test(testserver.ServerTestCase):
+    handler = Handler
+
+    def setUp(self):
+        Handler.received = []
+        testserver.ServerTestCase.setUp(self)
+
+    def test_stream(self):
+        http = httplib2.Http()
+        for path in ["/plain", "/gzip"]:
+            response, body = http.request(self.base + path, stream=True)
+            self.assertEqual(200, response.status)
+            self.assertFalse(isinstance(body, str))
+            self.assertFalse("content-encoding" in response)
+            chunks = list(body)
+            self.assertTrue(len(chunks) > 1)
+            self.assertEqual(MEDIA, "".join(chunks))
+            body.close()
+        # A request made while a body is still being streamed
+        # gets a connection of its own.
+        response, first = http.request(self.base + "/plain", stream=True)
+        response, second = http.request(self.base + "/plain")
+        self.assertEqual(MEDIA, second)
+        self.assertEqual(MEDIA, first.read())
+
+    def test_stream_from_pool(self):
+        http = httplib2.PooledHttp()
+        response, body = http.request(self.base + "/plain", stream=True)
+        self.assertEqual(1000, len(body.read(1000)))
+        self.assertEqual(0, http.stats()["idle"])
+        self.assertEqual(0, http.stats()["busy"])
+        body.close()
+
+    def test_upload_from_file(self):
+        f = tempfile.TemporaryFile()
+        f.write(MEDIA)
+        f.seek(0)
+        http = httplib2.Http()
+        response, content = http.request(self.base + "/media", method="PUT", body=f)
+        self.assertEqual(200, response.status)
+        self.assertEqual([MEDIA], Handler.received)
+
+    def test_upload_chunked(self):
+        class Pipe(object):
+            def __init__(self, data):
+                self._data = StringIO(data)
+            def read(self, size=-1):
+                return self._data.read(size)
+        http = httplib2.Http()
+        response, content = http.request(self.base + "/media", method="PUT", body=Pipe(MEDIA))
+        self.assertEqual(200, response.status)
+        self.assertEqual([MEDIA], Handler.received)
+
+    def test_progress_body_seek(self):
+        progress = []
+        f = StringIO(MEDIA)
+        f.seek(100)
+        body = httplib2._ProgressBody(f, lambda sent, total: progress.append(sent), len(MEDIA))
+        body.read(1000)
+        self.assertEqual([1000], progress)
+        body.seek(-500, 1)
+        body.read(500)
+        self.assertEqual([1000, 1000], progress)
+        body.seek(0, 2)
+        self.assertEqual(len(MEDIA), body.tell())
+        body.seek(100)
+        body.read(10)
+        self.assertEqual(10, progress[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+A local HTTP server for tests that need a real socket.
+
+A TestCase that derives from ServerTestCase and names its
+request handler gets a server on a free port for every test,
+with the URI of the server in 'self.base':
+
+    class Handler(testserver.Handler):
+        def do_GET(self):
+            self.send_body("hello")
+
+    class Test(testserver.ServerTestCase):
+        handler = Handler
+
+        def test_get(self):
+            response, content = httplib2.Http().request(self.base + "/")
+"""
+import unittest
+import threading
+import BaseHTTPServer
+import SocketServer
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    A request handler that keeps connections alive
+    and logs nothing.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def send_body(self, body, status=200, headers={}):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients under test close connections part way through.
+        pass
+
+
+def serve(handler, server_class=Server):
+    """
+    Start a server for 'handler' on a free port of the
+    loopback interface. Returns the server and its URI.
+    """
+    server = server_class(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.setDaemon(True)
+    thread.start()
+    return server, "http://127.0.0.1:%d" % server.server_address[1]
+
+
+def stop(server):
+    server.shutdown()
+    server.server_close()
+
+
+class ServerTestCase(unittest.TestCase):
+    handler = None
+    server_class = Server
+
+    def setUp(self):
+        self.server, self.base = serve(self.handler, self.server_class)
+
+    def tearDown(self):
+        stop(self.server)